@@ -2,9 +2,12 @@ import os
 import re
 import time
 import base64
-import pandas as pd
+import json
+import queue
+import threading
+import xlsxwriter
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from tqdm import tqdm
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -14,19 +17,25 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
+import lxml.html
 from urllib.parse import urljoin
 import requests
+from requests.adapters import HTTPAdapter
 
 # --- CONFIGURATION ---
 INDEX_URL = "http://arianna.consiglioregionale.piemonte.it/iterlegfo/"
 START_URL = "http://arianna.consiglioregionale.piemonte.it/iterlegfo/indiceCronoLeggi.do"
 OUTPUT_FOLDER = os.path.join(os.getcwd(), "Piemonte_Laws_Final")
 EXCEL_FILENAME = "Piemonte_Laws_Index.xlsx"
+DONE_FILENAME = "Piemonte_Done.jsonl"  # Resume index: one saved law per line
 
 # ⚠️ SETTINGS ⚠️
 VISIBLE_MODE = False   # Set to False for Headless
-MAX_WORKERS = 3        # Reduced slightly to prevent server blocking your IP
+FETCH_WORKERS = 16     # Plain HTTP fetch + abrogation screening (cheap)
+RENDER_WORKERS = 3     # Chrome printToPDF; kept low to prevent server blocking your IP
 MAX_RETRIES = 3 
+SAVE_EVERY = 10        # Flush the Excel index every N collected laws...
+SAVE_INTERVAL = 30     # ...or every N seconds, whichever comes first
 
 # Firefox User Agent
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/119.0"
@@ -37,12 +46,41 @@ ITALIAN_MONTHS = {
     'settembre': '09', 'ottobre': '10', 'novembre': '11', 'dicembre': '12'
 }
 
+_RE_NUM = re.compile(r"n\.?\s*(\d+)", re.IGNORECASE)
+_RE_DATE = re.compile(r"del\s+(\d{1,2})\s+([a-zA-Z]+)\s+(\d{4})", re.IGNORECASE)
+_RE_ABROG = re.compile(r'\(\s*Abrogata\s*\)', re.IGNORECASE)
+
 if not os.path.exists(OUTPUT_FOLDER):
     os.makedirs(OUTPUT_FOLDER)
 
 ALL_DATA = []
+DATA_LOCK = threading.Lock()
+
+# Laws already saved by a previous run (url -> index row), so reruns skip them
+DONE = {}
+DONE_PATH = os.path.join(OUTPUT_FOLDER, DONE_FILENAME)
+if os.path.exists(DONE_PATH):
+    with open(DONE_PATH, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                DONE[entry["url"]] = entry["data"]
+            except (ValueError, KeyError):
+                pass  # Ignore a line truncated by an interrupted run
+DONE_LOCK = threading.Lock()
+OUT_Q = queue.Queue()
+
+# Shared HTTP session for the fetch stage (one keep-alive pool for all threads)
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": USER_AGENT})
+SESSION.mount("http://", HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS))
+SESSION.mount("https://", HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS))
 
-def setup_driver():
+_DRIVER_PATH = None  # Resolved chromedriver binary, cached per process
+_DRIVER_LOCK = threading.Lock()
+
+def setup_driver(block_images=False):
+    """block_images is only for the listing/parse driver: printToPDF output must keep figures."""
     chrome_options = Options()
     
     # --- CRITICAL FIX FOR HEADLESS PDF SAVING ---
@@ -65,8 +103,28 @@ def setup_driver():
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-popup-blocking")
     chrome_options.add_argument("--log-level=3")
+
+    # Lean profile: skip the background subsystems a scraping session never uses
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-sync")
+    chrome_options.add_argument("--mute-audio")
+    chrome_options.add_argument("--disable-background-networking")
+    chrome_options.add_argument("--disable-renderer-backgrounding")
+    chrome_options.add_argument("--disable-features=TranslateUI,MediaRouter")
+    chrome_options.add_argument("--disk-cache-size=0")
+    prefs = {"profile.default_content_setting_values.notifications": 2}
+    if block_images:
+        # Index pages are parsed, never printed: images are dead weight there
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        prefs["profile.managed_default_content_settings.images"] = 2
+    chrome_options.add_experimental_option("prefs", prefs)
     
-    service = Service(ChromeDriverManager().install())
+    # Resolve the chromedriver binary once per process (render workers start a driver per law)
+    global _DRIVER_PATH
+    with _DRIVER_LOCK:
+        if _DRIVER_PATH is None:
+            _DRIVER_PATH = ChromeDriverManager().install()
+    service = Service(_DRIVER_PATH)
     return webdriver.Chrome(service=service, options=chrome_options)
 
 def clean_filename(text):
@@ -74,49 +132,40 @@ def clean_filename(text):
     text = text.replace("\n", " ").strip()
     return text[:50]
 
-def parse_italian_date(date_str):
-    try:
-        date_str = date_str.lower().strip()
-        for it_month, num_month in ITALIAN_MONTHS.items():
-            if it_month in date_str:
-                date_str = date_str.replace(it_month, num_month)
-                parts = date_str.split()
-                if len(parts) == 3:
-                    day, month, year = parts
-                    day = day.zfill(2)
-                    return f"{year}-{month}-{day}"
-    except:
-        pass
-    return "0000-00-00"
-
-def extract_metadata(soup):
-    # 1. TITLE
-    title_div = soup.find("div", id="titoloAtto")
-    if title_div:
-        for bur in title_div.find_all("div", class_="bur"):
-            bur.decompose()
-        law_title = title_div.get_text(" ", strip=True)
-    else:
-        law_title = "Title Not Found"
+def parse_italian_date(day, month_name, year):
+    return f"{year}-{ITALIAN_MONTHS.get(month_name.lower(), '00')}-{day.zfill(2)}"
+
+def node_text(node):
+    """Whitespace-normalised text of an lxml node (like BeautifulSoup's get_text(" ", strip=True))"""
+    return " ".join(" ".join(node.itertext()).split())
 
-    # 2. NUMBER & DATE
-    lead_span = soup.find('span', class_='lead')
-    full_text = lead_span.get_text(" ", strip=True) if lead_span else soup.get_text(" ", strip=True)
+def extract_metadata(root, page_text):
+    # 1. NUMBER & DATE (read before the title cleanup below mutates the tree)
+    lead_span = next((el for el in root.find_class('lead') if el.tag == 'span'), None)
+    full_text = node_text(lead_span) if lead_span is not None else page_text
     
-    num_match = re.search(r"n\.?\s*(\d+)", full_text, re.IGNORECASE)
+    num_match = _RE_NUM.search(full_text)
     law_num = num_match.group(1) if num_match else "Unknown"
 
-    date_match = re.search(r"del\s+(\d{1,2})\s+([a-zA-Z]+)\s+(\d{4})", full_text, re.IGNORECASE)
+    date_match = _RE_DATE.search(full_text)
     
     raw_date_display = "00/00/0000"
     filename_date = "0000-00-00"
 
     if date_match:
-        day = date_match.group(1)
-        month_name = date_match.group(2)
-        year = date_match.group(3)
+        day, month_name, year = date_match.groups()
         raw_date_display = f"{day} {month_name} {year}"
-        filename_date = parse_italian_date(raw_date_display)
+        filename_date = parse_italian_date(day, month_name, year)
+
+    # 2. TITLE
+    title_div = root.get_element_by_id("titoloAtto", None)
+    if title_div is not None:
+        for bur in title_div.find_class("bur"):
+            if bur.tag == "div":
+                bur.drop_tree()
+        law_title = node_text(title_div)
+    else:
+        law_title = "Title Not Found"
 
     return law_title, law_num, raw_date_display, filename_date
 
@@ -147,7 +196,7 @@ def remove_popups(driver):
     except:
         pass
 
-def is_law_abrogated(soup):
+def is_law_abrogated(page_text):
     """
     ═══════════════════════════════════════════════════════════════════════════
     STRICT ABROGATION CHECK - SINGLE RULE IMPLEMENTATION
@@ -168,12 +217,12 @@ def is_law_abrogated(soup):
     ❌ Any other variation
     
     IMPLEMENTATION DETAILS:
-    1. Extracts entire page text
+    1. Receives the entire page text (shared with extract_metadata)
     2. Applies strict regex pattern matching
     3. Returns True ONLY if pattern found in parentheses
     
     PARAMETERS:
-    - soup (BeautifulSoup): Parsed HTML of the law page
+    - page_text (str): Full text of the law page, extracted once by the worker
     
     RETURNS:
     - True: Law is abrogated (skip it)
@@ -182,9 +231,6 @@ def is_law_abrogated(soup):
     ═══════════════════════════════════════════════════════════════════════════
     """
     try:
-        # Extract all text from the page
-        page_text = soup.get_text(" ", strip=True)
-        
         # ═══════════════════════════════════════════════════════════════════
         # STRICT REGEX PATTERN - MATCHES ONLY: (Abrogata) or ( Abrogata )
         # ═══════════════════════════════════════════════════════════════════
@@ -196,10 +242,8 @@ def is_law_abrogated(soup):
         # \)        - Literal closing parenthesis
         # ═══════════════════════════════════════════════════════════════════
         
-        abrogata_pattern = r'\(\s*Abrogata\s*\)'
-        
-        # Search for the pattern (case-insensitive)
-        match = re.search(abrogata_pattern, page_text, re.IGNORECASE)
+        # Search for the pattern (case-insensitive, precompiled as _RE_ABROG)
+        match = _RE_ABROG.search(page_text)
         
         if match:
             # Pattern found - law is abrogated
@@ -213,10 +257,68 @@ def is_law_abrogated(soup):
         # (Conservative approach to avoid false positives)
         return False
 
+def mark_done(law_url, data):
+    """Appends a saved law to the resume index (flushed immediately)"""
+    with DONE_LOCK:
+        with open(DONE_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"url": law_url, "data": data}, ensure_ascii=False) + "\n")
+            f.flush()
+
 def process_law_worker(law_url):
     """
     ═══════════════════════════════════════════════════════════════════════════
-    LAW PROCESSING WORKER WITH STRICT ABROGATION FILTERING
+    FETCH STAGE - PLAIN HTTP SCREENING (runs on the large fetch pool)
+    ═══════════════════════════════════════════════════════════════════════════
+    
+    WORKFLOW:
+    0. If the law is in the DONE resume index → return its saved row
+    1. Download the law page with the shared requests SESSION
+    2. Parse it once with lxml and extract its text
+    3. **CHECK ABROGATION STATUS** (CRITICAL STEP)
+       - If (Abrogata) pattern found → return "Skipped (Abrogated)"
+    4. Extract metadata (title, number, date)
+    5. Return a render job for render_law_worker()
+    
+    FALLBACK:
+    If the page cannot be fetched, or #titoloAtto is missing from the raw
+    HTML (content needs JavaScript), the job is returned without metadata
+    and the render stage screens the page from the Selenium DOM instead.
+    
+    RETURNS:
+    - (job, "Fetched"): job = {"url": ..., "meta": tuple or None}
+    - (row, "Cached"): saved by a previous run, row re-enters the index
+    - (None, "Skipped (Abrogated)")
+    
+    ═══════════════════════════════════════════════════════════════════════════
+    """
+    if law_url in DONE:
+        return DONE[law_url], "Cached"
+
+    job = {"url": law_url, "meta": None}
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            resp = SESSION.get(law_url, timeout=15)
+            resp.raise_for_status()
+            root = lxml.html.fromstring(resp.content)
+            if root.get_element_by_id("titoloAtto", None) is None:
+                break  # Not server-rendered, let Selenium handle it
+
+            page_text = node_text(root)
+            if is_law_abrogated(page_text):
+                return None, "Skipped (Abrogated)"
+
+            job["meta"] = extract_metadata(root, page_text)
+            break
+        except Exception:
+            time.sleep(1)
+
+    return job, "Fetched"
+
+def render_law_worker(job):
+    """
+    ═══════════════════════════════════════════════════════════════════════════
+    RENDER STAGE - PDF GENERATION (runs on the small render pool)
     ═══════════════════════════════════════════════════════════════════════════
     
     WORKFLOW:
@@ -224,24 +326,23 @@ def process_law_worker(law_url):
     2. Load the law page
     3. Wait for content to render
     4. Remove any blocking popups
-    5. Parse page content with BeautifulSoup
-    6. **CHECK ABROGATION STATUS** (CRITICAL STEP)
-       - If (Abrogata) pattern found → SKIP and close driver
-       - If pattern NOT found → Continue processing
-    7. Extract metadata (title, number, date)
-    8. Generate PDF using Chrome DevTools Protocol
-    9. Save PDF to disk
-    10. Validate file size
-    11. Return result and status
+    5. If the fetch stage had no metadata: parse the Selenium DOM with
+       lxml, run the abrogation check and extract metadata here
+    6. Generate PDF using Chrome DevTools Protocol
+    7. Save PDF to disk
+    8. Validate file size
+    9. Return result and status
     
     ABROGATION LOGIC:
-    - Uses is_law_abrogated() function
+    - Uses is_law_abrogated() function (fallback path only)
     - Returns immediately if law is abrogated
     - Status: "Skipped (Abrogated)"
     - No PDF is generated for abrogated laws
     
     ═══════════════════════════════════════════════════════════════════════════
     """
+    law_url = job["url"]
+    meta = job["meta"]
     attempt = 0
     status = "Failed"
     res = None
@@ -264,24 +365,29 @@ def process_law_worker(law_url):
             # Small buffer for headless rendering
             time.sleep(1)
 
-            # Parse page content
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            
-            # ═══════════════════════════════════════════════════════════════
-            # CRITICAL ABROGATION CHECK
-            # ═══════════════════════════════════════════════════════════════
-            # Check if law contains (Abrogata) pattern
-            # If TRUE: Skip this law and close driver immediately
-            # If FALSE: Continue processing
-            # ═══════════════════════════════════════════════════════════════
-            
-            if is_law_abrogated(soup):
-                status = "Skipped (Abrogated)"
-                driver.quit()
-                return None, status
-            
-            # Law is valid - proceed with metadata extraction
-            title, num, raw_date_display, filename_date = extract_metadata(soup)
+            if meta is None:
+                # Parse page content once; the text feeds both the abrogation
+                # check and the metadata regexes
+                root = lxml.html.fromstring(driver.page_source)
+                page_text = node_text(root)
+                
+                # ═══════════════════════════════════════════════════════════
+                # CRITICAL ABROGATION CHECK
+                # ═══════════════════════════════════════════════════════════
+                # Check if law contains (Abrogata) pattern
+                # If TRUE: Skip this law and close driver immediately
+                # If FALSE: Continue processing
+                # ═══════════════════════════════════════════════════════════
+                
+                if is_law_abrogated(page_text):
+                    status = "Skipped (Abrogated)"
+                    driver.quit()
+                    return None, status
+                
+                # Law is valid - proceed with metadata extraction
+                meta = extract_metadata(root, page_text)
+
+            title, num, raw_date_display, filename_date = meta
             
             region = "Piemonte"
             filename = f"{region}_{clean_filename(num)}_{filename_date}.pdf"
@@ -314,6 +420,7 @@ def process_law_worker(law_url):
                         "Date": raw_date_display,
                         "Filename": filename
                     }
+                    mark_done(law_url, res)
                     break 
                 else:
                     status = "Failed (Empty)"
@@ -372,7 +479,8 @@ def get_links_for_year(year_url):
     All links are collected regardless of status indicators in the list view.
     
     FILTERING LOCATION:
-    All abrogation checking is done in process_law_worker() function.
+    All abrogation checking is done in process_law_worker() (or in
+    render_law_worker() when the fetch stage falls back to Selenium).
     
     ═══════════════════════════════════════════════════════════════════════════
     """
@@ -382,8 +490,8 @@ def get_links_for_year(year_url):
     page_count = 0
     
     try:
-        # Initialize Selenium driver for pagination
-        driver = setup_driver()
+        # Initialize Selenium driver for pagination (never prints, so no images)
+        driver = setup_driver(block_images=True)
         driver.get(year_url)
         
         # Wait for initial page load
@@ -517,35 +625,85 @@ def get_links_for_year(year_url):
     return law_links
 
 def save_excel():
-    if ALL_DATA:
-        df = pd.DataFrame(ALL_DATA)
-        requested_columns = ["Region", "Law Title", "Law Number", "Date", "Filename"]
-        final_cols = [c for c in requested_columns if c in df.columns]
-        df = df[final_cols]
-        df.to_excel(os.path.join(OUTPUT_FOLDER, EXCEL_FILENAME), index=False)
+    with DATA_LOCK:
+        rows = list(ALL_DATA)
+    if rows:
+        # Stream rows straight to disk (constant memory, no DataFrame round-trip)
+        columns = ["Region", "Law Title", "Law Number", "Date", "Filename"]
+        wb = xlsxwriter.Workbook(os.path.join(OUTPUT_FOLDER, EXCEL_FILENAME), {'constant_memory': True})
+        ws = wb.add_worksheet()
+        ws.write_row(0, 0, columns)
+        for i, row in enumerate(rows, 1):
+            ws.write_row(i, 0, [row.get(c, "") for c in columns])
+        wb.close()
+
+def writer_loop():
+    """
+    Background persistence thread.
+    Consumes result dicts from OUT_Q and rewrites the Excel index every
+    SAVE_EVERY items or SAVE_INTERVAL seconds, so the main thread never
+    blocks on disk while draining finished workers.
+    A None item is the shutdown sentinel: flush once more and exit.
+    """
+    pending = 0
+    last_save = time.monotonic()
+    while True:
+        try:
+            item = OUT_Q.get(timeout=SAVE_INTERVAL)
+        except queue.Empty:
+            item = False  # Timeout: just check whether a flush is due
+
+        if item is None:
+            save_excel()
+            OUT_Q.task_done()
+            return
+
+        if item:
+            with DATA_LOCK:
+                ALL_DATA.append(item)
+            pending += 1
+            OUT_Q.task_done()
+
+        if pending and (pending >= SAVE_EVERY or time.monotonic() - last_save >= SAVE_INTERVAL):
+            save_excel()
+            pending = 0
+            last_save = time.monotonic()
 
 def main():
     print(f"📂 SAVING TO: {os.path.abspath(OUTPUT_FOLDER)}")
-    print("🚀 MODE: HEADLESS=NEW (Stable) + 3 Workers")
+    print(f"🚀 MODE: HEADLESS=NEW (Stable) + {FETCH_WORKERS} Fetch / {RENDER_WORKERS} Render Workers")
     print("🔍 FILTER: Strict (Abrogata) Pattern Check ONLY")
     print("⚠️  RULE: Skip ONLY if pattern found in parentheses")
     
     years = get_year_list()
     if not years: return
 
-    for y_info in tqdm(years, desc="Total Years"):
-        links = get_links_for_year(y_info['url'])
-        if not links: continue
-
-        with tqdm(total=len(links), desc=f"   Processing {y_info['year']}", leave=False) as pbar:
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = [executor.submit(process_law_worker, link) for link in links]
-                for future in as_completed(futures):
-                    data, status = future.result()
-                    pbar.update(1)
-                    if data: ALL_DATA.append(data)
-                    if len(ALL_DATA) % 10 == 0: save_excel()
-        save_excel()
+    writer = threading.Thread(target=writer_loop, daemon=True)
+    writer.start()
+
+    # Two independent pools: cheap HTTP screening never waits behind the
+    # expensive Chrome renders, and only surviving laws reach the renderer
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as fetch_pool, \
+         ThreadPoolExecutor(max_workers=RENDER_WORKERS) as render_pool:
+        for y_info in tqdm(years, desc="Total Years"):
+            links = get_links_for_year(y_info['url'])
+            if not links: continue
+
+            with tqdm(total=len(links), desc=f"   Processing {y_info['year']}", leave=False) as pbar:
+                pending = {fetch_pool.submit(process_law_worker, link) for link in links}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        data, status = future.result()
+                        if status == "Fetched":
+                            pending.add(render_pool.submit(render_law_worker, data))
+                            continue
+                        pbar.update(1)
+                        if data: OUT_Q.put(data)
+
+    # Final flush: the sentinel makes the writer save everything and exit
+    OUT_Q.put(None)
+    writer.join()
     
     print(f"\n✅ All Done! Files saved to: {os.path.abspath(OUTPUT_FOLDER)}")
 
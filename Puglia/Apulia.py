@@ -1,7 +1,9 @@
 import os
-import time
 import base64
 import re
+import threading
+import requests
+import lxml.html
 import pandas as pd
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -13,6 +15,7 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+from requests.adapters import HTTPAdapter
 
 # --- CONFIGURATION ---
 START_URL = "https://bussolanormativa.consiglio.puglia.it/public/Leges/RicercaSemplice.aspx"
@@ -21,15 +24,42 @@ EXCEL_FILENAME = "Puglia_Laws_Index.xlsx"
 MAX_WORKERS = 3       # Parallel downloads (Safe number for headless)
 MAX_PAGES = 107       # Total pages to process
 
+# Resources never needed for scraping or printing
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.woff*", "*.ttf",
+    "*googletagmanager*", "*google-analytics*"
+]
+
+# Law links in the results grid
+LAW_LINKS = (By.XPATH, "//a[contains(@href, 'LeggeNavscroll.aspx')]")
+LAW_LINKS_CSS = "a[href*='LeggeNavscroll.aspx']"
+
 # --- HEADERS / SESSION LOGIC ---
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
+# Plain HTTP session for the law detail pages (shared keep-alive pool)
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": USER_AGENT})
+SESSION.mount("https://", HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+
 if not os.path.exists(OUTPUT_FOLDER):
     os.makedirs(OUTPUT_FOLDER)
 
 # Global accumulator
 ALL_DATA = []
 
+# Filenames already in OUTPUT_FOLDER: listed once per page, extended as PDFs are saved
+EXISTING_FILES = set()
+
+# Worker driver pool: each worker thread keeps one headless Chrome for the whole run
+_tls = threading.local()
+_WORKER_DRIVERS = []
+_DRIVERS_LOCK = threading.Lock()
+_DRIVER_PATH = None
+
+# PDF decode + disk write runs here, so the worker's Chrome can move on to the next law
+PDF_WRITER = ThreadPoolExecutor(max_workers=2)
+
 def setup_driver(headless=True):
     """
     Initializes Chrome with Session + Headers logic.
@@ -54,12 +84,21 @@ def setup_driver(headless=True):
     chrome_options.add_argument("--start-maximized") 
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--log-level=3")
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
     
-    service = Service(ChromeDriverManager().install())
+    # Resolve the chromedriver binary once per process
+    global _DRIVER_PATH
+    if _DRIVER_PATH is None:
+        _DRIVER_PATH = ChromeDriverManager().install()
+    service = Service(_DRIVER_PATH)
     driver = webdriver.Chrome(service=service, options=chrome_options)
     
     # 4. MASK BOT VIA CDP
     driver.execute_cdp_cmd('Network.setUserAgentOverride', {"userAgent": USER_AGENT})
+
+    # 5. SKIP HEAVY RESOURCES (CSS stays: Page.printToPDF needs the layout)
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
     
     return driver
 
@@ -68,7 +107,24 @@ def clean_filename(text):
     text = text.replace("\n", " ").strip()
     return text[:50]
 
+def write_pdf(data, filepath):
+    """Decodes printToPDF output and writes it (runs on PDF_WRITER). Returns success."""
+    tmp_path = filepath + ".part"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(base64.b64decode(data))
+        # Rename last: a half-written file never looks "already downloaded"
+        os.replace(tmp_path, filepath)
+        return True
+    except Exception as e:
+        print(f"⚠️ Failed to write {os.path.basename(filepath)}: {e}")
+        EXISTING_FILES.discard(os.path.basename(filepath))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
 def save_as_pdf(driver, filepath):
+    """Prints the page and queues the write; returns the write future, or None if printing failed."""
     try:
         result = driver.execute_cdp_cmd("Page.printToPDF", {
             "printBackground": True,
@@ -76,69 +132,148 @@ def save_as_pdf(driver, filepath):
             "marginTop": 0.4, "marginBottom": 0.4,
             "displayHeaderFooter": False
         })
-        with open(filepath, "wb") as f:
-            f.write(base64.b64decode(result['data']))
-        return True
+        return PDF_WRITER.submit(write_pdf, result['data'], filepath)
     except Exception:
-        return False
+        return None
 
 def extract_metadata(driver):
+    """Reads date, number and title in a single WebDriver round trip."""
     try:
-        try:
-            raw_date = driver.find_element(By.ID, "ContentPlaceHolder1_lblData").text.strip()
-        except:
-            raw_date = "01/01/1900"
-        try:
-            raw_num = driver.find_element(By.ID, "ContentPlaceHolder1_lblNumero").text.strip()
-        except:
-            raw_num = "Unknown"
-        try:
-            titles = driver.find_elements(By.XPATH, "//p[@align='center']")
-            raw_title = "Title Not Found"
-            for t in titles:
-                if len(t.text.strip()) > 15: 
-                    raw_title = t.text.strip()
-                    break
-        except:
-            raw_title = "Title Not Found"
-        return raw_title, raw_num, raw_date
+        data = driver.execute_script("""
+            const d = document.getElementById('ContentPlaceHolder1_lblData');
+            const n = document.getElementById('ContentPlaceHolder1_lblNumero');
+            let title = 'Title Not Found';
+            for (const p of document.querySelectorAll("p[align='center']")) {
+                const t = p.innerText.trim();
+                if (t.length > 15) { title = t; break; }
+            }
+            return {date: d ? d.innerText.trim() : null, num: n ? n.innerText.trim() : null, title: title};
+        """)
+        raw_date = data['date'] if data['date'] is not None else "01/01/1900"
+        raw_num = data['num'] if data['num'] is not None else "Unknown"
+        return data['title'], raw_num, raw_date
     except Exception:
         return "Error", "0", "01/01/1900"
 
+def get_worker_driver():
+    """Returns the calling thread's persistent driver, creating it on first use."""
+    driver = getattr(_tls, "driver", None)
+    if driver is None:
+        # Worker always runs headless
+        driver = setup_driver(headless=True)
+        _tls.driver = driver
+        with _DRIVERS_LOCK:
+            _WORKER_DRIVERS.append(driver)
+    return driver
+
+def discard_worker_driver():
+    """Drops the calling thread's driver (e.g. after a crash) so the next task gets a fresh one."""
+    driver = getattr(_tls, "driver", None)
+    if driver is None:
+        return
+    _tls.driver = None
+    with _DRIVERS_LOCK:
+        if driver in _WORKER_DRIVERS:
+            _WORKER_DRIVERS.remove(driver)
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+def shutdown_worker_drivers():
+    """Quits every pooled worker driver. Called once the executor has finished."""
+    with _DRIVERS_LOCK:
+        drivers = list(_WORKER_DRIVERS)
+        _WORKER_DRIVERS.clear()
+    for driver in drivers:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+def fetch_metadata(url):
+    """
+    Reads title, number and date from the raw ASP.NET page with requests + lxml,
+    using the same locators as extract_metadata().
+    Returns None when the labels are not in the server HTML (needs the browser).
+    """
+    resp = SESSION.get(url, timeout=20)
+    resp.raise_for_status()
+    root = lxml.html.fromstring(resp.content)
+
+    date_el = root.get_element_by_id("ContentPlaceHolder1_lblData", None)
+    if date_el is None:
+        return None
+    raw_date = date_el.text_content().strip() or "01/01/1900"
+
+    num_el = root.get_element_by_id("ContentPlaceHolder1_lblNumero", None)
+    raw_num = num_el.text_content().strip() if num_el is not None else "Unknown"
+
+    raw_title = "Title Not Found"
+    for t in root.xpath("//p[@align='center']"):
+        text = " ".join(t.text_content().split())
+        if len(text) > 15:
+            raw_title = text
+            break
+
+    return raw_title, raw_num, raw_date
+
+def build_filename(num, raw_date):
+    # Date Clean
+    try:
+        dt = datetime.strptime(raw_date, "%d/%m/%Y")
+        file_date = dt.strftime("%Y-%m-%d")
+    except:
+        file_date = "0000-00-00"
+
+    return f"Puglia_{clean_filename(num)}_{file_date}.pdf"
+
 def process_law_worker(url):
-    """Worker: Opens URL with Headers -> Scrapes -> Downloads PDF."""
-    driver = None
+    """
+    Worker: Fetches metadata over plain HTTP -> Skips existing files ->
+    Prints the PDF with the thread's Chrome only when it is actually needed.
+    """
     res = None
     status = "Failed"
+    write = None  # Background PDF write; its result settles the final status
     
     try:
-        # Worker always runs headless
-        driver = setup_driver(headless=True) 
-        driver.get(url)
-        
-        # Wait for data
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "ContentPlaceHolder1_lblData")))
-        
-        title, num, raw_date = extract_metadata(driver)
-
-        # Date Clean
+        # 1. Cheap path: metadata straight from the server HTML
         try:
-            dt = datetime.strptime(raw_date, "%d/%m/%Y")
-            file_date = dt.strftime("%Y-%m-%d")
-        except:
-            file_date = "0000-00-00"
+            meta = fetch_metadata(url)
+        except Exception:
+            meta = None
 
-        filename = f"Puglia_{clean_filename(num)}_{file_date}.pdf"
-        filepath = os.path.join(OUTPUT_FOLDER, filename)
+        filename = build_filename(meta[1], meta[2]) if meta else None
 
-        if not os.path.exists(filepath):
-            if save_as_pdf(driver, filepath):
-                status = "Downloaded"
-            else:
-                status = "Failed"
-        else:
+        if filename and filename in EXISTING_FILES:
+            # Already saved by a previous run: no browser round trip at all
             status = "Skipped"
+        else:
+            # 2. Browser path: render (and, as a fallback, read metadata from the DOM)
+            driver = get_worker_driver()
+            driver.get(url)
+            
+            # Wait for data
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "ContentPlaceHolder1_lblData")))
+            
+            if meta is None:
+                meta = extract_metadata(driver)
+                filename = build_filename(meta[1], meta[2])
 
+            filepath = os.path.join(OUTPUT_FOLDER, filename)
+
+            if filename not in EXISTING_FILES:
+                write = save_as_pdf(driver, filepath)
+                if write is not None:
+                    EXISTING_FILES.add(filename)
+                    status = "Downloaded"
+                else:
+                    status = "Failed"
+            else:
+                status = "Skipped"
+
+        title, num, raw_date = meta
         res = {
             "Region": "Puglia",
             "Law Title": title,
@@ -150,11 +285,10 @@ def process_law_worker(url):
 
     except Exception:
         status = "Failed"
-    finally:
-        if driver:
-            driver.quit()
+        # The browser may be in a bad state; replace it for the next task
+        discard_worker_driver()
     
-    return res, status
+    return res, status, write
 
 def save_excel_batch():
     if not ALL_DATA:
@@ -172,6 +306,8 @@ def run_main_process():
     # Main driver is now HEADLESS
     driver = setup_driver(headless=True) 
     wait = WebDriverWait(driver, 15)
+    # One pool for the whole run so worker threads (and their drivers) survive across pages
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
     
     try:
         print(f"🔍 Accessing Search Page (Headless Mode)...")
@@ -186,7 +322,10 @@ def run_main_process():
             checkbox = driver.find_element(By.ID, "Leggi")
             driver.execute_script("arguments[0].click();", checkbox)
         
-        time.sleep(1)
+        try:
+            wait.until(EC.element_located_to_be_selected((By.ID, "Leggi")))
+        except:
+            pass
 
         # --- STEP 2: SEARCH ---
         print("👆 Clicking Search...")
@@ -195,7 +334,7 @@ def run_main_process():
         
         print("⏳ Waiting for results...")
         wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-        time.sleep(2) 
+        wait.until(EC.presence_of_element_located(LAW_LINKS))
 
         # --- STEP 3: BATCH PROCESSING ---
         print(f"🚀 Starting Batch Processing (1 to {MAX_PAGES})...")
@@ -213,42 +352,46 @@ def run_main_process():
                         next_dots = driver.find_elements(By.XPATH, "//a[contains(text(), '...')]")
                         if next_dots:
                             driver.execute_script("arguments[0].click();", next_dots[-1])
-                            time.sleep(3)
-                            page_link = driver.find_element(By.LINK_TEXT, str(page_num))
+                            page_link = wait.until(EC.presence_of_element_located((By.LINK_TEXT, str(page_num))))
                         else:
                             raise Exception("Pagination link not found.")
 
-                    first_row_before = driver.find_element(By.XPATH, "//tr[2]").text 
+                    first_row_before = driver.find_element(By.XPATH, "//tr[2]")
                     driver.execute_script("arguments[0].click();", page_link)
                     
-                    WebDriverWait(driver, 10).until(
-                        lambda d: d.find_element(By.XPATH, "//tr[2]").text != first_row_before
-                    )
-                    time.sleep(1)
+                    # The postback replaces the grid: wait for the old row to detach,
+                    # then for the new page's law links
+                    WebDriverWait(driver, 10).until(EC.staleness_of(first_row_before))
+                    wait.until(EC.presence_of_element_located(LAW_LINKS))
                 
                 except Exception as e:
                     print(f"⚠️ Failed to navigate to Page {page_num}: {e}")
                     continue
 
             # B. Get Links
-            current_elements = driver.find_elements(By.XPATH, "//a[contains(@href, 'LeggeNavscroll.aspx')]")
-            batch_links = []
-            for el in current_elements:
-                href = el.get_attribute('href')
-                if href and href not in batch_links:
-                    batch_links.append(href)
+            # One script call returns every href (no per-element WebDriver round trip);
+            # the JS Set dedupes while keeping DOM order
+            batch_links = driver.execute_script(
+                "return Array.from(new Set(Array.from(document.querySelectorAll(arguments[0]))"
+                ".map(a => a.href).filter(Boolean)));", LAW_LINKS_CSS)
             
             print(f"   🔗 Found {len(batch_links)} laws. Starting parallel download...")
 
             # C. Download
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = [executor.submit(process_law_worker, url) for url in batch_links]
-                
-                # Progress bar for current batch
-                for future in tqdm(as_completed(futures), total=len(batch_links), desc=f"   Batch {page_num}", leave=False):
-                    data, status = future.result()
-                    if data:
-                        ALL_DATA.append(data)
+            EXISTING_FILES.update(os.listdir(OUTPUT_FOLDER))
+            futures = [executor.submit(process_law_worker, url) for url in batch_links]
+            
+            # Progress bar for current batch
+            for future in tqdm(as_completed(futures), total=len(batch_links), desc=f"   Batch {page_num}", leave=False):
+                data, status, write = future.result()
+                # "Downloaded" only counts once the file is actually on disk
+                if write is not None and not write.result():
+                    status = "Failed"
+                if data:
+                    if status == "Failed":
+                        # Never list a PDF that is not on disk
+                        data["Filename"] = "Failed Download"
+                    ALL_DATA.append(data)
 
             # D. Save to Excel
             save_excel_batch()
@@ -256,6 +399,9 @@ def run_main_process():
     except Exception as e:
         print(f"❌ Critical Error: {e}")
     finally:
+        executor.shutdown(wait=True)
+        PDF_WRITER.shutdown(wait=True)
+        shutdown_worker_drivers()
         driver.quit()
         print("\n✅ Process Completed.")
 
@@ -1,16 +1,34 @@
 import os
 import re
+import functools
 import requests
 import pandas as pd
 from bs4 import BeautifulSoup
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm  # Library for progress bar
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root: shared helpers
+from conditional_download import load_download_index, download_one
 
 # --- CONFIGURATION ---
 URL = "https://www.consregsardegna.it/leggi-approvate-xvii-legislatura/"
 DOWNLOAD_FOLDER = "Sardinia_Laws_PDFs"
 EXCEL_FILENAME = "Sardinia_Laws_Metadata.xlsx"
 REGION_NAME = "Sardinia"
+DOWNLOAD_WORKERS = 8  # Parallel PDF downloads over one keep-alive pool
+# Sidecar with ETag / Last-Modified / length per PDF URL (conditional GET + resume)
+DOWNLOAD_INDEX_FILE = os.path.join(DOWNLOAD_FOLDER, "downloads.json")
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# One session for the page and every PDF: connections (and TLS) are reused
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
 
 # Italian to Number Month Mapping (Only used for Filename generation)
 MONTH_MAP = {
@@ -20,50 +38,51 @@ MONTH_MAP = {
     'ottobre': '10', 'novembre': '11', 'dicembre': '12'
 }
 
+# Precompiled patterns (used once per PDF link)
+_LAW_RE_1 = re.compile(r'Legge regionale\s+(.*?),\s*n\.\s*(\d+)', re.IGNORECASE)
+_LAW_RE_2 = re.compile(r'Legge regionale\s+n\.\s*(\d+)\s+del\s+(.*)', re.IGNORECASE)
+_BAD_FN = re.compile(r'[\\/*?:"<>|]')
+# Day (optionally "1°"), Italian month name, year -- one match, one dict lookup
+_IT_DATE_RE = re.compile(r'(?P<d>\d{1,2})°?\s+(?P<mon>' + '|'.join(MONTH_MAP) + r')\s+(?P<y>\d{4})', re.IGNORECASE)
+
 def clean_filename(text):
     """Removes illegal characters from filenames."""
-    return re.sub(r'[\\/*?:"<>|]', "", text)
+    return _BAD_FN.sub("", text)
 
+def save_excel(extracted_data):
+    """Writes the collected metadata to Excel."""
+    try:
+        df = pd.DataFrame(extracted_data)
+        df.to_excel(EXCEL_FILENAME, index=False)
+    except Exception as e:
+        # If Excel is open, it might fail to write.
+        pass
+
+@functools.lru_cache(maxsize=4096)  # Pure; many laws share a date string
 def get_iso_date_from_italian(date_str):
     """
     Parses '1° dicembre 2025' -> Returns '2025-12-01' (for filename).
     Returns None if parsing fails.
     """
-    try:
-        # Clean up "1°" to "1"
-        clean_str = date_str.replace("1°", "1").lower()
-        parts = clean_str.split()
-        
-        if len(parts) >= 3:
-            day = parts[0].zfill(2) # Ensure 01, 02 etc.
-            month_txt = parts[1]
-            year = parts[2]
-            
-            if month_txt in MONTH_MAP:
-                month_num = MONTH_MAP[month_txt]
-                return f"{year}-{month_num}-{day}"
-    except Exception:
+    m = _IT_DATE_RE.search(date_str)
+    if not m:
         return None
-    return None
+    return f"{m['y']}-{MONTH_MAP[m['mon'].lower()]}-{m['d'].zfill(2)}"
 
 def scrape_laws():
     # Create download directory
     if not os.path.exists(DOWNLOAD_FOLDER):
         os.makedirs(DOWNLOAD_FOLDER)
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-
     print(f"Fetching {URL}...")
     try:
-        response = requests.get(URL, headers=headers)
+        response = SESSION.get(URL, timeout=30)
         response.raise_for_status()
     except Exception as e:
         print(f"Failed to load page: {e}")
         return
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    soup = BeautifulSoup(response.content, 'lxml')  # C parser (libxml2)
     
     # Find all potential PDF links
     links = [a for a in soup.find_all('a', href=True) if a['href'].lower().endswith('.pdf')]
@@ -71,8 +90,13 @@ def scrape_laws():
     print(f"Found {len(links)} PDF links. Starting extraction...")
 
     extracted_data = []
+    downloads = []  # (href, pdf_path) pairs for phase 2
+    queued = set()
+    index = load_download_index(DOWNLOAD_INDEX_FILE)
+    # One directory listing instead of an exists() syscall per law
+    existing = set(os.listdir(DOWNLOAD_FOLDER))
 
-    # --- PROGRESS BAR LOOP ---
+    # --- PHASE 1: METADATA (pure parsing, no network) ---
     # tqdm wraps the list 'links' to create a progress bar
     for link in tqdm(links, desc="Processing Laws", unit="file"):
         href = link['href']
@@ -80,11 +104,11 @@ def scrape_laws():
         
         # --- REGEX EXTRACTION ---
         # 1. Try: "Legge regionale 1° dicembre 2025, n. 33"
-        match = re.search(r'Legge regionale\s+(.*?),\s*n\.\s*(\d+)', link_text, re.IGNORECASE)
+        match = _LAW_RE_1.search(link_text)
         
         if not match:
             # 2. Try: "Legge regionale n. 33 del 1° dicembre 2025"
-            match = re.search(r'Legge regionale\s+n\.\s*(\d+)\s+del\s+(.*)', link_text, re.IGNORECASE)
+            match = _LAW_RE_2.search(link_text)
             if match:
                 law_num = match.group(1)
                 law_date_it = match.group(2).strip()
@@ -121,27 +145,27 @@ def scrape_laws():
         }
         extracted_data.append(row)
 
-        # --- DOWNLOAD PDF ---
+        # --- QUEUE PDF ---
         pdf_path = os.path.join(DOWNLOAD_FOLDER, new_filename)
-        if not os.path.exists(pdf_path):
-            try:
-                pdf_resp = requests.get(href, headers=headers, stream=True)
-                with open(pdf_path, 'wb') as f:
-                    for chunk in pdf_resp.iter_content(chunk_size=8192):
-                        f.write(chunk)
-            except Exception as e:
-                # If download fails, we still record metadata but log error
-                # You can choose to break or continue. Here we continue.
-                pass 
-        
-        # --- FREQUENT SAVING ---
-        # Save to Excel after every iteration to ensure no data loss
-        try:
-            df = pd.DataFrame(extracted_data)
-            df.to_excel(EXCEL_FILENAME, index=False)
-        except Exception as e:
-            # If Excel is open, it might fail to write.
-            pass
+        # Missing files are fetched; files known to the index are resumed or
+        # revalidated (304 = skip). Older files without an entry are left alone.
+        if pdf_path not in queued and (href in index or new_filename not in existing):
+            queued.add(pdf_path)  # Never let two threads write the same file
+            downloads.append((href, pdf_path))
+
+    # Metadata is complete at this point: save it once
+    save_excel(extracted_data)
+
+    # --- PHASE 2: PARALLEL DOWNLOADS ---
+    failed = 0
+    if downloads:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            futures = [executor.submit(download_one, SESSION, href, path, index, DOWNLOAD_INDEX_FILE) for href, path in downloads]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Downloading PDFs", unit="file"):
+                if future.result().startswith("Failed"):
+                    failed += 1
+        if failed:
+            print(f"{failed} PDF downloads failed.")
 
     print(f"\nCompleted! Scraped {len(extracted_data)} laws.")
     print(f"Metadata saved to: {EXCEL_FILENAME}")
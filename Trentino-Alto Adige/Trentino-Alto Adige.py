@@ -1,10 +1,17 @@
 import os
 import re
-import time
+import threading
+import functools
 import requests
-import pandas as pd
+import xlsxwriter
+import lxml.html
 from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root: shared helpers
+from conditional_download import load_download_index, download_one
 
 # --- Selenium Imports ---
 from selenium import webdriver
@@ -20,6 +27,11 @@ START_URL = "https://www.regione.taa.it/Documenti/Atti-normativi"
 BASE_URL = "https://www.regione.taa.it"
 DOWNLOAD_DIR = "pdf_downloads"
 EXCEL_FILE = "laws_metadata.xlsx"
+EXCEL_HEADERS = ["Page", "Region", "Law Title", "Law Number", "Date", "Type", "Filename", "Status", "URL"]
+LAW_LINK_CSS = "a[href*='/content/view/full/']"
+# Sidecar with ETag / Last-Modified / length per PDF URL (conditional GET + resume)
+DOWNLOAD_INDEX_FILE = os.path.join(DOWNLOAD_DIR, "downloads.json")
+DOWNLOAD_WORKERS = 8  # Concurrent PDF downloads, overlapped with the Selenium crawl
 
 # Month Map
 MONTH_MAP = {
@@ -31,6 +43,17 @@ MONTH_MAP = {
     'september': '09', 'october': '10', 'november': '11', 'december': '12'
 }
 
+# Precompiled patterns (used once per law)
+_DATE_SLASH_RE = re.compile(r'(\d{1,2})[./-](\d{1,2})[./-](\d{4})')
+# Month alternation built from MONTH_MAP, so a match always has a known month
+_MONTHS_ALT = '|'.join(MONTH_MAP)
+_DATE_TXT_RE = re.compile(r'(?P<d>\d{1,2})°?\s+(?P<mon>' + _MONTHS_ALT + r')\s+(?P<y>\d{4})', re.IGNORECASE)
+_DATE_TXT_MDY_RE = re.compile(r'(?P<mon>' + _MONTHS_ALT + r')\s+(?P<d>\d{1,2}),?\s+(?P<y>\d{4})', re.IGNORECASE)
+_YEAR_RE = re.compile(r'20\d{2}|19\d{2}')
+_LAW_NUM_RE = re.compile(r'n\.?\s*(\d+)', re.IGNORECASE)
+
+_DRIVER_PATH = None  # Resolved chromedriver binary, cached per process
+
 def setup_driver():
     options = webdriver.ChromeOptions()
     # --- HEADLESS MODE ---
@@ -39,30 +62,42 @@ def setup_driver():
     options.add_argument("--disable-gpu")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--blink-settings=imagesEnabled=false")
     options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36")
     
-    return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    global _DRIVER_PATH
+    if _DRIVER_PATH is None:
+        _DRIVER_PATH = ChromeDriverManager().install()
+    driver = webdriver.Chrome(service=Service(_DRIVER_PATH), options=options)
+
+    # Only ids, text and links are read: never download images, fonts, CSS or trackers
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": [
+        "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.woff*", "*.ttf", "*.css",
+        "*googletagmanager*", "*google-analytics*"
+    ]})
+    return driver
 
 def clean_date_string(text):
     if not text: return None, None
     text = text.replace("Data", "").replace("\n", " ").strip()
-    
-    match_slash = re.search(r'(\d{1,2})[./-](\d{1,2})[./-](\d{4})', text)
+    return parse_date_text(text)
+
+@functools.lru_cache(maxsize=4096)  # Pure; many laws share a date string
+def parse_date_text(text):
+    """Cleaned date text -> (dd/mm/yyyy, yyyy-mm-dd), or (None, None)."""
+    match_slash = _DATE_SLASH_RE.search(text)
     if match_slash:
         d, m, y = match_slash.groups()
         return f"{d.zfill(2)}/{m.zfill(2)}/{y}", f"{y}-{m.zfill(2)}-{d.zfill(2)}"
 
-    match_txt = re.search(r'(\d{1,2})\s+([a-zA-Z]+)\s+(\d{4})', text)
-    if not match_txt:
-        match_txt = re.search(r'([a-zA-Z]+)\s+(\d{1,2}),?\s+(\d{4})', text)
-        if match_txt: m_txt, d, y = match_txt.groups()
-        else: return None, None
-    else:
-        d, m_txt, y = match_txt.groups()
+    match_txt = _DATE_TXT_RE.search(text) or _DATE_TXT_MDY_RE.search(text)
+    if not match_txt: return None, None
 
-    m_num = MONTH_MAP.get(m_txt.lower())
-    if m_num: return f"{d.zfill(2)}/{m_num}/{y}", f"{y}-{m_num}-{d.zfill(2)}"
-    return None, None
+    d = match_txt['d'].zfill(2)
+    m_num = MONTH_MAP[match_txt['mon'].lower()]
+    y = match_txt['y']
+    return f"{d}/{m_num}/{y}", f"{y}-{m_num}-{d}"
 
 def determine_pdf_type(url_or_name):
     """
@@ -74,6 +109,97 @@ def determine_pdf_type(url_or_name):
     if "_st" in text or "-st." in text or "_de" in text: return "DE"
     return "DOC" # Default type
 
+def has_class(name):
+    """XPath predicate matching one class token (like CSS '.name')."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+def parse_law_html(content, url):
+    """
+    Reads a law page from the server HTML: (title, date candidates, h1 text, PDF hrefs).
+    Returns None when the XPaths come back empty (page needs JS -> Selenium fallback).
+    """
+    doc = lxml.html.fromstring(content)
+    h1 = doc.xpath("//h1")
+    if not h1: return None
+    h1 = h1[0]
+    h1_text = h1.text_content().strip()
+
+    # Title sits in the text node right after the <h1>
+    tail = (h1.tail or "").strip()
+    title = tail if len(tail) > 5 else h1_text
+
+    date_candidates = [el.text_content() for el in doc.xpath(f"//strong[{has_class('text-nowrap')}]")]
+    date_candidates += [el.text_content() for el in doc.xpath(f"//div[{has_class('col-md-3')}][contains(., 'Data')]")[:1]]
+
+    pdf_hrefs = doc.xpath(f"//div[{has_class('card-teaser')} or {has_class('download-list')}]//a/@href")
+    if not pdf_hrefs:
+        pdf_hrefs = doc.xpath("//a[substring(@href, string-length(@href) - 3) = '.pdf']/@href")
+    if not pdf_hrefs: return None
+
+    return title, date_candidates, h1_text, [urljoin(url, h) for h in pdf_hrefs]
+
+def read_law_with_driver(driver, url, list_handle):
+    """Selenium fallback for parse_law_html: same tuple, read from a rendered tab."""
+    try:
+        driver.switch_to.new_window('tab')
+        driver.get(url)
+
+        # A. TITLE
+        title = "Unknown"
+        try:
+            h1_elem = driver.find_element(By.TAG_NAME, "h1")
+            title_text = driver.execute_script("return arguments[0].nextSibling.textContent;", h1_elem).strip()
+            if len(title_text) > 5: title = title_text
+            else: title = h1_elem.text.strip()
+        except:
+            try: title = driver.find_element(By.CSS_SELECTOR, "font[dir='auto']").text.strip()
+            except: pass
+
+        # B. DATE: every strong.text-nowrap, then the first 'Data' column, in one round trip
+        try:
+            date_candidates = driver.execute_script(
+                "return [...document.querySelectorAll('strong.text-nowrap')].map(e => e.innerText)"
+                ".concat([...document.querySelectorAll('div.col-md-3')]"
+                ".filter(e => e.textContent.includes('Data')).slice(0, 1).map(e => e.innerText));")
+        except: date_candidates = []
+
+        # C. LAW NUMBER (from the h1)
+        try: h1_text = driver.find_element(By.TAG_NAME, "h1").text
+        except: h1_text = ""
+
+        # D. PDFs: ANY download link inside "card-teaser" or "download-list"
+        pdf_elements = driver.find_elements(By.CSS_SELECTOR, "div.card-teaser a, div.download-list a")
+        if not pdf_elements:
+             # Fallback: Look for any link ending in .pdf
+             pdf_elements = driver.find_elements(By.CSS_SELECTOR, "a[href$='.pdf']")
+        pdf_hrefs = [el.get_attribute('href') for el in pdf_elements]
+
+        return title, date_candidates, h1_text, pdf_hrefs
+    finally:
+        # Close the law tab and return to the still-loaded list
+        try:
+            if driver.current_window_handle != list_handle: driver.close()
+        except: pass
+        driver.switch_to.window(list_handle)
+
+def click_and_wait_for_list(driver, element, timeout=15):
+    """Clicks an element that reloads the law list, then waits for the new list instead of sleeping."""
+    old = driver.find_elements(By.CSS_SELECTOR, LAW_LINK_CSS)[:1]
+    driver.execute_script("arguments[0].click();", element)
+    wait = WebDriverWait(driver, timeout)
+    try:
+        if old: wait.until(EC.staleness_of(old[0]))
+        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, LAW_LINK_CSS)))
+    except TimeoutException:
+        pass  # Carry on with whatever is loaded, as the old fixed sleep did
+
+def open_excel_stream():
+    """Opens EXCEL_FILE for append-only writing: xlsxwriter streams each row to disk (constant memory)."""
+    wb = xlsxwriter.Workbook(EXCEL_FILE, {'constant_memory': True})
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, EXCEL_HEADERS)
+    return wb, ws
+
 def main():
     if not os.path.exists(DOWNLOAD_DIR): os.makedirs(DOWNLOAD_DIR)
 
@@ -84,32 +210,48 @@ def main():
         "Accept-Language": "en-US,en;q=0.5",
         "Connection": "keep-alive"
     })
+    # Keep-alive pool large enough for every download thread plus the law-page fetches
+    adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS + 1)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    # PDFs download in the background while the driver moves on to the next law
+    download_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS)
+    queued_paths = set()
+    download_index = load_download_index(DOWNLOAD_INDEX_FILE)
 
     print("--- Launching Headless Scraper (Fixed PDF Logic) ---")
     driver = setup_driver()
     wait = WebDriverWait(driver, 15)
-    all_data = []
+
+    # Rows are written once, when final; download callbacks write from worker threads
+    wb, ws = open_excel_stream()
+    excel_lock = threading.Lock()
+    excel_row = 1
+
+    def write_excel_row(row):
+        nonlocal excel_row
+        with excel_lock:
+            ws.write_row(excel_row, 0, [row[k] for k in EXCEL_HEADERS])
+            excel_row += 1
     
     # PAGE COUNTER
     page_num = 1
 
     try:
         driver.get(START_URL)
-        time.sleep(2)
 
         try:
             btn = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(),'Accetta') or contains(text(),'Acconsento')]")))
             btn.click()
-            time.sleep(1)
+            wait.until(EC.invisibility_of_element(btn))
         except: pass
 
         print("Applying Filter...")
         try:
             filter_btn = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "a[data-tag_id='13618']")))
             driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", filter_btn)
-            time.sleep(1)
-            filter_btn.click()
-            time.sleep(5)
+            click_and_wait_for_list(driver, filter_btn)
         except Exception as e:
             print(f"Filter Error: {e}"); return
 
@@ -117,65 +259,49 @@ def main():
             # PRINT PAGE NUMBER
             print(f"\n--- Processing Page {page_num} ---")
             
-            law_urls = []
-            elements = driver.find_elements(By.CSS_SELECTOR, "a[href*='/content/view/full/']")
-            for el in elements: law_urls.append(el.get_attribute('href'))
-            law_urls = list(set(law_urls))
+            # One script call for all hrefs, deduped in DOM order
+            law_urls = driver.execute_script(
+                "return Array.from(new Set(Array.from(document.querySelectorAll(arguments[0]))"
+                ".map(a => a.href).filter(Boolean)));", LAW_LINK_CSS)
 
             print(f"Found {len(law_urls)} laws...")
 
+            # One directory listing per page instead of an exists() syscall per PDF
+            existing = set(os.listdir(DOWNLOAD_DIR))
+
+            # Laws open in a separate tab so the list keeps its filter and page
+            list_handle = driver.current_window_handle
+
             for url in tqdm(law_urls, desc=f"Page {page_num}"):
                 try:
-                    driver.get(url)
-                    
-                    # A. TITLE
-                    title = "Unknown"
+                    # Law pages are server-rendered: plain HTTP on the warm session,
+                    # Chrome only when the static HTML has nothing to read
                     try:
-                        h1_elem = driver.find_element(By.TAG_NAME, "h1")
-                        title_text = driver.execute_script("return arguments[0].nextSibling.textContent;", h1_elem).strip()
-                        if len(title_text) > 5: title = title_text
-                        else: title = h1_elem.text.strip()
-                    except:
-                        try: title = driver.find_element(By.CSS_SELECTOR, "font[dir='auto']").text.strip()
-                        except: pass
+                        law = parse_law_html(session.get(url, timeout=20).content, url)
+                    except Exception:
+                        law = None
+                    if law is None:
+                        law = read_law_with_driver(driver, url, list_handle)
+                    title, date_candidates, h1_text, pdf_hrefs = law
 
                     # B. DATE
                     excel_date = "Unknown"
                     file_date_iso = "0000-00-00"
-                    date_candidates = []
-                    
-                    try: strongs = driver.find_elements(By.CSS_SELECTOR, "strong.text-nowrap"); date_candidates.extend([s.text for s in strongs])
-                    except: pass
-                    try: 
-                        d_el = driver.find_element(By.XPATH, "//div[contains(@class, 'col-md-3')][contains(., 'Data')]")
-                        date_candidates.append(d_el.text)
-                    except: pass
 
                     for txt in date_candidates:
                         ed, fd = clean_date_string(txt)
                         if ed: excel_date = ed; file_date_iso = fd; break
                     
                     if file_date_iso == "0000-00-00":
-                        y_match = re.search(r'20\d{2}|19\d{2}', title)
+                        y_match = _YEAR_RE.search(title)
                         if y_match: y = y_match.group(0); excel_date = f"01/01/{y}"; file_date_iso = f"{y}-01-01"
 
                     # C. LAW NUMBER
-                    try:
-                        h1_text = driver.find_element(By.TAG_NAME, "h1").text
-                        n_match = re.search(r'n\.?\s*(\d+)', h1_text, re.IGNORECASE)
-                        law_num = n_match.group(1) if n_match else "0"
-                    except: law_num = "0"
-
-                    # D. PROCESS PDFs (Fixed Selector)
-                    # We look for ANY download link inside "card-teaser" or "download-list"
-                    pdf_elements = driver.find_elements(By.CSS_SELECTOR, "div.card-teaser a, div.download-list a")
-                    
-                    if not pdf_elements:
-                         # Fallback: Look for any link ending in .pdf
-                         pdf_elements = driver.find_elements(By.CSS_SELECTOR, "a[href$='.pdf']")
+                    n_match = _LAW_NUM_RE.search(h1_text)
+                    law_num = n_match.group(1) if n_match else "0"
 
-                    for pdf_el in pdf_elements:
-                        pdf_href = pdf_el.get_attribute('href')
+                    # D. PROCESS PDFs
+                    for pdf_href in pdf_hrefs:
                         if not pdf_href: continue
 
                         # Determine type or default
@@ -184,21 +310,7 @@ def main():
                         filename = f"TrentinoAA_{law_num}_{file_date_iso}_{suffix}.pdf"
                         save_path = os.path.join(DOWNLOAD_DIR, filename)
                         
-                        # 👇 SKIP CHECK HERE
-                        status = "Skipped"
-                        if not os.path.exists(save_path):
-                            try:
-                                # Use requests session to download (more reliable than selenium here)
-                                r = session.get(pdf_href, stream=True, timeout=30)
-                                if r.status_code == 200 and 'application/pdf' in r.headers.get('Content-Type', ''):
-                                    with open(save_path, 'wb') as f:
-                                        for chunk in r.iter_content(chunk_size=8192): f.write(chunk)
-                                    status = "Downloaded"
-                                else:
-                                    status = f"Failed ({r.status_code})"
-                            except: status = "Failed"
-                        
-                        all_data.append({
+                        row = {
                             "Page": page_num,
                             "Region": "Trentino-Alto Adige",
                             "Law Title": title,
@@ -206,60 +318,51 @@ def main():
                             "Date": excel_date,
                             "Type": suffix,
                             "Filename": filename,
-                            "Status": status,
+                            "Status": "Skipped",
                             "URL": url
-                        })
+                        }
+
+                        # 👇 SKIP CHECK HERE
+                        # Missing files are fetched; files known to the index are resumed
+                        # or revalidated. Older files without an entry are left alone.
+                        if save_path not in queued_paths and (pdf_href in download_index or filename not in existing):
+                            queued_paths.add(save_path)
+                            future = download_pool.submit(download_one, session, pdf_href, save_path, download_index, DOWNLOAD_INDEX_FILE, True)
+                            # The row is written when the download finishes, with its real status
+                            future.add_done_callback(lambda f, row=row: write_excel_row({**row, "Status": f.result()}))
+                        else:
+                            write_excel_row(row)
 
                 except Exception: pass
-            
-            pd.DataFrame(all_data).to_excel(EXCEL_FILE, index=False)
 
-            # Pagination
-            print("Returning to list...")
-            driver.get(START_URL)
-            time.sleep(2)
+            # Pagination: the list tab is still on the current page,
+            # so move forward from here without reloading START_URL.
+            # Try finding the next page number directly
             try:
-                filter_btn = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "a[data-tag_id='13618']")))
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", filter_btn)
-                time.sleep(1)
-                filter_btn.click()
-                time.sleep(4)
-                
-                # Navigate to next page
-                # We need to click "Successiva" X times to get back to where we were
-                # BUT this site handles pagination weirdly.
-                # A safer way is to find the page number link.
-                
-                # Try finding the next page number directly
-                try:
-                    next_page_link = driver.find_element(By.XPATH, f"//a[contains(@class, 'page-link') and text()='{page_num + 1}']")
-                    driver.execute_script("arguments[0].click();", next_page_link)
-                    time.sleep(5)
-                    page_num += 1
-                except:
-                    # Try "Successiva" button as fallback
-                    next_btn = None
-                    selectors = ["//a[@title='Successiva']", "//a[contains(@class, 'next')]", "//li[contains(@class,'next')]//a"]
-                    for xpath in selectors:
-                        try:
-                            btn = driver.find_element(By.XPATH, xpath)
-                            if btn.is_displayed(): next_btn = btn; break
-                        except: continue
-
-                    if next_btn:
-                        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", next_btn)
-                        driver.execute_script("arguments[0].click();", next_btn)
-                        time.sleep(5)
-                        page_num += 1
-                    else:
-                        print("No more pages found.")
-                        break
-            except: break
+                next_btn = driver.find_element(By.XPATH, f"//a[contains(@class, 'page-link') and text()='{page_num + 1}']")
+            except:
+                # Try "Successiva" button as fallback
+                next_btn = None
+                selectors = ["//a[@title='Successiva']", "//a[contains(@class, 'next')]", "//li[contains(@class,'next')]//a"]
+                for xpath in selectors:
+                    try:
+                        btn = driver.find_element(By.XPATH, xpath)
+                        if btn.is_displayed(): next_btn = btn; break
+                    except: continue
+
+            if next_btn:
+                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", next_btn)
+                click_and_wait_for_list(driver, next_btn)
+                page_num += 1
+            else:
+                print("No more pages found.")
+                break
 
     except Exception as e: print(f"Error: {e}")
     finally:
         driver.quit()
-        if all_data: pd.DataFrame(all_data).to_excel(EXCEL_FILE, index=False)
+        download_pool.shutdown(wait=True)
+        wb.close()
         print("Done.")
 
 if __name__ == "__main__":
@@ -1,16 +1,28 @@
 import asyncio
 import os
 import re
-import pandas as pd
-import dateparser
+import csv
+import shutil
+import xlsxwriter
+from datetime import datetime
 from tqdm.asyncio import tqdm
 from urllib.parse import urljoin
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 
 BASE_URL = "https://raccoltanormativa.consiglio.regione.toscana.it/"
 OUTPUT_DIR = "Toscana_Laws_PDFs"
+DOWNLOADS_TMP_DIR = OUTPUT_DIR + "_tmp"  # Playwright's GUID-named temp files, next to OUTPUT_DIR but not in it
 EXCEL_FILE = "Toscana_Laws_Data.xlsx"
+RESULTS_CSV = "Toscana_Laws_Data.csv"  # Appended in batches during the run, converted to EXCEL_FILE at the end
+FLUSH_EVERY = 50  # Rows buffered before a background CSV append
+COLUMNS = ["Region", "Law Title", "Law Number", "Date", "Filename", "Source URL"]
 MAX_PARALLEL_TABS = 3
+NAV_TIMEOUT = 30000  # ms; default for every navigation, so a stuck page cannot hang a tab
+ICON_TIMEOUT = 10000  # ms; how long a scripted page gets to render the PDF icon
+PDF_ICON = "img[alt='Scarica il documento corrente in formato PDF']"
+ARTICLE_LINKS = "a[href*='articolo?urndoc=']"
+# Never needed for the text or the PDF download. Images stay: the menu and PDF controls are <img>
+BLOCKED_RESOURCES = {"font", "media", "websocket", "stylesheet"}
 
 HEADERS = {
     "User-Agent":
@@ -18,208 +30,340 @@ HEADERS = {
         "(KHTML, like Gecko) Chrome/114.0 Safari/537.36"
 }
 
-results_data = []
-processed_urls = set()
+# Italian Month Mapping (both directions: parsing and readable dates)
+ITALIAN_MONTHS = {
+    'gennaio': '01', 'febbraio': '02', 'marzo': '03', 'aprile': '04',
+    'maggio': '05', 'giugno': '06', 'luglio': '07', 'agosto': '08',
+    'settembre': '09', 'ottobre': '10', 'novembre': '11', 'dicembre': '12'
+}
+MONTH_NAMES = list(ITALIAN_MONTHS)
+
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Compiled once at import (used on every law page)
+_MONTHS_RE = "(gennaio|febbraio|marzo|aprile|maggio|giugno|luglio|agosto|settembre|ottobre|novembre|dicembre)"
+# Legge regionale 8 gennaio 2025, n. 3
+_PAT1 = re.compile(r'(\d{1,2}\s+' + _MONTHS_RE + r'\s+\d{4}).*?(?:n\.|numero)\s*(\d+)', re.I)
+# n. 3 del 08/01/2025
+_PAT2 = re.compile(r'(?:n\.|numero)\s*(\d+)\s+del\s+(\d{2}/\d{2}/\d{4})')
+
 
 # ================= METADATA EXTRACTOR =================
+def format_dates(dt):
+    """datetime -> (ISO date, readable Italian date), independent of the locale."""
+    return dt.strftime("%Y-%m-%d"), f"{dt.day} {MONTH_NAMES[dt.month - 1]} {dt.year}"
+
+
 def extract_metadata(text):
     text = text.lower().replace("\n", " ")
 
     # -------- Pattern A -------------
     # Legge regionale 8 gennaio 2025, n. 3
-    pat1 = re.search(
-        r'(\d{1,2}\s+'
-        r'(gennaio|febbraio|marzo|aprile|maggio|giugno|luglio|agosto|settembre|ottobre|novembre|dicembre)'
-        r'\s+\d{4}).*?(?:n\.|numero)\s*(\d+)',
-        text,
-        re.I
-    )
+    pat1 = _PAT1.search(text)
 
     if pat1:
-        date_str = pat1.group(1)
+        day, month_it, year = pat1.group(1).split()
         law_number = pat1.group(3)
-        dt = dateparser.parse(date_str, languages=["it"])
-
-        iso = dt.strftime("%Y-%m-%d")
-        readable = f"{dt.day} {dt.strftime('%B')} {dt.year}"
-        return law_number, iso, readable
+        dt = datetime(int(year), int(ITALIAN_MONTHS[month_it]), int(day))
+        return law_number, *format_dates(dt)
 
     # -------- Pattern B -------------
     # n. 3 del 08/01/2025
-    pat2 = re.search(
-        r'(?:n\.|numero)\s*(\d+)\s+del\s+(\d{2}/\d{2}/\d{4})',
-        text
-    )
+    pat2 = _PAT2.search(text)
 
     if pat2:
         law_number = pat2.group(1)
-        date_str = pat2.group(2)
-        dt = dateparser.parse(date_str, languages=["it"])
-
-        iso = dt.strftime("%Y-%m-%d")
-        readable = f"{dt.day} {dt.strftime('%B')} {dt.year}"
-        return law_number, iso, readable
+        dt = datetime.strptime(pat2.group(2), "%d/%m/%Y")
+        return law_number, *format_dates(dt)
 
     return "Unknown", "0000-00-00", ""
 
 
-# ================= SAVE EXCEL =================
-def save_excel():
-    if not results_data:
-        return
-    df = pd.DataFrame(results_data)
-    cols = ["Region", "Law Title", "Law Number", "Date", "Filename", "Source URL"]
-
-    for c in cols:
-        if c not in df.columns:
-            df[c] = ""
+# ================= SAVE RESULTS =================
+def start_results_csv():
+    """Truncates RESULTS_CSV and writes the header row."""
+    with open(RESULTS_CSV, "w", newline="", encoding="utf-8") as f:
+        csv.DictWriter(f, fieldnames=COLUMNS).writeheader()
 
-    df = df[cols]
-
-    try:
-        df.to_excel(EXCEL_FILE, index=False)
-    except PermissionError:
-        print("⚠ Close Excel to update results.")
 
+def append_results(rows):
+    """Appends rows to RESULTS_CSV (runs in a worker thread, off the event loop)."""
+    with open(RESULTS_CSV, "a", newline="", encoding="utf-8") as f:
+        csv.DictWriter(f, fieldnames=COLUMNS).writerows(rows)
 
-# ================= PROCESS EACH LAW =================
-async def process_article(sem, context, url, pbar, counters):
-    async with sem:
-        page = await context.new_page()
-
-        try:
-            await page.goto(url, timeout=60000)
-
-            page_text = await page.inner_text("body")
-            law_number, iso_date, readable_date = extract_metadata(page_text)
-
-            title = "Unknown Title"
-            if await page.locator("#titolo_doc").count() > 0:
-                title = await page.locator("#titolo_doc").inner_text()
-
-            icon = "img[alt='Scarica il documento corrente in formato PDF']"
-            if await page.locator(icon).count() == 0:
-                counters["skipped"] += 1
-                return
 
-            async with page.expect_download() as dl:
-                await page.click(icon)
+def new_run_state():
+    """Everything one run shares between article coroutines (no module-level globals)."""
+    return {
+        "processed_urls": set(),
+        "counters": {"downloaded": 0, "skipped": 0, "failed": 0},
+        "pending_rows": [],
+        "write_lock": asyncio.Lock(),  # One CSV append at a time
+    }
 
-            download = await dl.value
-            temp_path = await download.path()
 
-            final_name = f"Tuscany_{law_number}_{iso_date}.pdf"
-            final_path = os.path.join(OUTPUT_DIR, final_name)
-            os.replace(temp_path, final_path)
+async def flush_results(state):
+    """Hands the buffered rows to a thread; the event loop keeps serving the other tabs."""
+    rows, state["pending_rows"] = state["pending_rows"], []
+    if rows:
+        async with state["write_lock"]:
+            # run_in_executor rather than asyncio.to_thread (3.9+): the README supports 3.8
+            await asyncio.get_running_loop().run_in_executor(None, append_results, rows)
 
-            counters["downloaded"] += 1
 
-            results_data.append({
-                "Region": "Toscana",
-                "Law Title": title.strip(),
-                "Law Number": law_number,
-                "Date": readable_date,
-                "Filename": final_name,
-                "Source URL": url
-            })
+async def record_result(state, row):
+    state["pending_rows"].append(row)
+    if len(state["pending_rows"]) >= FLUSH_EVERY:
+        await flush_results(state)
 
-            if len(results_data) % 5 == 0:
-                save_excel()
 
-            pbar.update(1)
-            pbar.set_description(f"Downloaded {counters['downloaded']}")
+def save_excel():
+    """Converts RESULTS_CSV to EXCEL_FILE, streaming row by row (constant memory)."""
+    with open(RESULTS_CSV, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        first = next(reader, None)
+        if first is None:
+            return
 
-        except Exception as e:
-            counters["failed"] += 1
-            print("ERROR:", e)
+        try:
+            wb = xlsxwriter.Workbook(EXCEL_FILE, {'constant_memory': True})
+            ws = wb.add_worksheet()
+            ws.write_row(0, 0, header)
+            ws.write_row(1, 0, first)
+            for i, row in enumerate(reader, 2):
+                ws.write_row(i, 0, row)
+            wb.close()
+        except (PermissionError, xlsxwriter.exceptions.FileCreateError):
+            print("⚠ Close Excel to update results.")
 
-        finally:
-            await page.close()
 
+# ================= RESOURCE BLOCKING =================
+async def block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCES:
+        await route.abort()
+    else:
+        await route.continue_()
 
-# ================= MAIN =================
-async def main():
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True   # <= 🔥🔥 HEADLESS MODE ENABLED
-        )
 
-        context = await browser.new_context(
-            accept_downloads=True,
-            user_agent=HEADERS["User-Agent"]
-        )
+# ================= PROCESS EACH LAW =================
+async def download_with_js(context, url, final_path):
+    """Fallback: open the article in the JS context and click the PDF icon.
+    Returns False when even the scripted page has no icon."""
+    page = await context.new_page()
+    try:
+        await page.goto(url)
+        try:
+            # Covers icons that only scripts render
+            await page.wait_for_selector(PDF_ICON, timeout=ICON_TIMEOUT)
+        except PlaywrightTimeoutError:
+            return False
+        async with page.expect_download() as dl:
+            await page.click(PDF_ICON)
 
-        page = await context.new_page()
-        await page.goto(BASE_URL)
-        await page.wait_for_load_state("networkidle")
+        download = await dl.value
+        await download.save_as(final_path)
+        return True
+    finally:
+        await page.close()
 
-        menu_frame = None
-        for f in page.frames:
-            if await f.locator("img[name='j0_0']").count() > 0:
-                menu_frame = f
-                break
 
-        if not menu_frame:
-            menu_frame = page
+async def process_article(context, no_js_context, url, pbar, state):
+    counters = state["counters"]
+    # Metadata and the PDF link are server-rendered: read them with JS off
+    page = await no_js_context.new_page()
 
-        await menu_frame.click("img[name='j0_0']")
-        await page.wait_for_timeout(1500)
+    try:
+        await page.goto(url)
 
-        all_links = await menu_frame.locator("a").all()
-        years = sorted(
-            {(await l.inner_text()).strip()
-             for l in all_links
-             if (await l.inner_text()).strip().isdigit()},
-            reverse=True
+        # Only the title block is transferred; it carries the date and number
+        header = await page.evaluate(
+            "() => document.querySelector('#titolo_doc')?.innerText || ''"
         )
+        law_number, iso_date, readable_date = extract_metadata(header)
+        if law_number == "Unknown":
+            # Header missing or without the pattern: fall back to the full body
+            page_text = await page.inner_text("body")
+            law_number, iso_date, readable_date = extract_metadata(page_text)
 
-        sem = asyncio.Semaphore(MAX_PARALLEL_TABS)
-        counters = {"downloaded": 0, "skipped": 0, "failed": 0}
-
-        for year in years:
-            print(f"\nYEAR: {year}")
+        title = header or "Unknown Title"
+
+        final_name = f"Tuscany_{law_number}_{iso_date}.pdf"
+        final_path = os.path.join(OUTPUT_DIR, final_name)
+
+        # Plain link around the icon: fetch it directly (same cookies, no second page load)
+        icon = page.locator(PDF_ICON)
+        href = ""
+        if await icon.count():
+            href = await icon.first.evaluate("img => img.closest('a')?.href || ''")
+        saved = False
+        if href.startswith("http"):
+            resp = await page.request.get(href)
+            if resp.ok and "pdf" in resp.headers.get("content-type", "").lower():
+                with open(final_path, "wb") as f:
+                    f.write(await resp.body())
+                saved = True
+
+        if not saved:
+            # The download (or the icon itself) needs the page's scripts
+            if not await download_with_js(context, url, final_path):
+                counters["skipped"] += 1
+                return
 
-            xpath = f"//a[contains(text(), '{year}')]/preceding::img[contains(@name, 'j0_')][1]"
-            icon = menu_frame.locator(f"xpath={xpath}")
+        counters["downloaded"] += 1
 
-            if await icon.count() == 0:
-                continue
+        await record_result(state, {
+            "Region": "Toscana",
+            "Law Title": title.strip(),
+            "Law Number": law_number,
+            "Date": readable_date,
+            "Filename": final_name,
+            "Source URL": url
+        })
 
-            await icon.first.click()
-            await page.wait_for_timeout(2000)
+        pbar.update(1)
+        pbar.set_description(f"Downloaded {counters['downloaded']}")
 
-            articles = menu_frame.locator("a[href*='articolo?urndoc=']")
-            count = await articles.count()
+    except Exception as e:
+        counters["failed"] += 1
+        print("ERROR:", e)
 
-            if count == 0:
-                continue
+    finally:
+        await page.close()
 
-            urls = []
-            for i in range(count):
-                href = await articles.nth(i).get_attribute("href")
-                full = urljoin(BASE_URL, href)
 
-                if full not in processed_urls:
-                    processed_urls.add(full)
-                    urls.append(full)
+async def article_worker(queue, context, no_js_context, pbar, state):
+    """Takes URLs off the queue until it is empty: MAX_PARALLEL_TABS of these bound the open tabs."""
+    while True:
+        try:
+            url = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        await process_article(context, no_js_context, url, pbar, state)
 
-            pbar = tqdm(total=len(urls), desc=f"Year {year}", leave=False)
 
-            tasks = [
-                process_article(sem, context, u, pbar, counters)
-                for u in urls
-            ]
+# ================= MAIN =================
+async def main():
+    start_results_csv()
 
-            await asyncio.gather(*tasks)
-            pbar.close()
+    state = new_run_state()
 
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(
+                headless=True,   # <= 🔥🔥 HEADLESS MODE ENABLED
+                # Temp downloads land on the same filesystem as the final PDFs, outside the PDF folder
+                downloads_path=DOWNLOADS_TMP_DIR
+            )
+
+            context = await browser.new_context(
+                accept_downloads=True,
+                user_agent=HEADERS["User-Agent"]
+            )
+            await context.route("**/*", block_heavy_resources)
+            context.set_default_navigation_timeout(NAV_TIMEOUT)
+
+            # Article pages: no page scripts (trackers, analytics) run at all
+            no_js_context = await browser.new_context(
+                java_script_enabled=False,
+                accept_downloads=True,
+                user_agent=HEADERS["User-Agent"]
+            )
+            await no_js_context.route("**/*", block_heavy_resources)
+            no_js_context.set_default_navigation_timeout(NAV_TIMEOUT)
+
+            page = await context.new_page()
+            await page.goto(BASE_URL)
+            await page.wait_for_load_state("networkidle")
+
+            menu_frame = None
+            for f in page.frames:
+                if await f.locator("img[name='j0_0']").count() > 0:
+                    menu_frame = f
+                    break
+
+            if not menu_frame:
+                menu_frame = page
+
+            await menu_frame.click("img[name='j0_0']")
+            # Ready as soon as the expanded tree shows year links
+            try:
+                await menu_frame.wait_for_function(
+                    "() => [...document.querySelectorAll('a')].some(a => /^\\s*\\d{4}\\s*$/.test(a.textContent))",
+                    timeout=5000
+                )
+            except PlaywrightTimeoutError:
+                pass
+
+            all_links = await menu_frame.locator("a").all()
+            years = sorted(
+                {(await l.inner_text()).strip()
+                 for l in all_links
+                 if (await l.inner_text()).strip().isdigit()},
+                reverse=True
+            )
+
+            for year in years:
+                print(f"\nYEAR: {year}")
+
+                xpath = f"//a[contains(text(), '{year}')]/preceding::img[contains(@name, 'j0_')][1]"
+                icon = menu_frame.locator(f"xpath={xpath}")
+
+                if await icon.count() == 0:
+                    continue
+
+                articles = menu_frame.locator(ARTICLE_LINKS)
+                before = await articles.count()
+
+                await icon.first.click()
+                # The year's articles have loaded once the article link count changes
+                try:
+                    await menu_frame.wait_for_function(
+                        "([sel, n]) => document.querySelectorAll(sel).length !== n",
+                        arg=[ARTICLE_LINKS, before],
+                        timeout=10000
+                    )
+                except PlaywrightTimeoutError:
+                    pass
+
+                # Every href in one round trip instead of one get_attribute per link
+                hrefs = await articles.evaluate_all("els => els.map(e => e.getAttribute('href'))")
+
+                if not hrefs:
+                    continue
+
+                urls = []
+                for href in hrefs:
+                    full = urljoin(BASE_URL, href)
+
+                    if full not in state["processed_urls"]:
+                        state["processed_urls"].add(full)
+                        urls.append(full)
+
+                pbar = tqdm(total=len(urls), desc=f"Year {year}", leave=False)
+
+                # Fixed pool of workers over a queue: O(MAX_PARALLEL_TABS) live coroutines
+                # instead of one per URL; results reach RESULTS_CSV in FLUSH_EVERY batches
+                queue = asyncio.Queue()
+                for u in urls:
+                    queue.put_nowait(u)
+
+                await asyncio.gather(*(
+                    article_worker(queue, context, no_js_context, pbar, state)
+                    for _ in range(MAX_PARALLEL_TABS)
+                ))
+                pbar.close()
+
+            print("\nDONE 🎯")
+            print(state["counters"])
+
+            await browser.close()
+    finally:
+        # Crash or Ctrl+C: the buffered rows still reach the CSV and the Excel file
+        await flush_results(state)
         save_excel()
-        print("\nDONE 🎯")
-        print(counters)
-
-        await browser.close()
+        # Temp files of interrupted downloads are never saved anywhere
+        shutil.rmtree(DOWNLOADS_TMP_DIR, ignore_errors=True)
 
 
 if __name__ == "__main__":
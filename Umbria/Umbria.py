@@ -1,17 +1,13 @@
 import os
-import time
-import base64
 import re
-import pandas as pd
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import csv
+import asyncio
+from operator import itemgetter
+import xlsxwriter
 from tqdm import tqdm
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
+from playwright.async_api import async_playwright
+import lxml.html
+from bs4 import BeautifulSoup, SoupStrainer
 import requests
 
 # --- CONFIGURATION ---
@@ -19,7 +15,9 @@ BASE_URL = "https://leggi.alumbria.it/"
 START_URL = "https://leggi.alumbria.it/leggi_02.php"
 OUTPUT_FOLDER = os.path.join(os.getcwd(), "Umbria_Laws_Scrape")
 EXCEL_FILENAME = "Umbria_Laws_Index.xlsx"
-MAX_WORKERS = 3
+RESULTS_CSV = "Umbria_Laws_Index.csv"  # Appended row by row during the run, converted to Excel at the end
+COLUMNS = ["Region", "Law Title", "Law Number", "Date", "Filename", "URL"]
+MAX_WORKERS = 3       # Concurrent tabs in the one shared browser
 TIMEOUT_SECONDS = 20  # ⏳ Max wa9t l kol page (20 seconds)
 
 # Italian Month Mapping
@@ -29,134 +27,100 @@ ITALIAN_MONTHS = {
     'settembre': '09', 'ottobre': '10', 'novembre': '11', 'dicembre': '12'
 }
 
-# Suppress WDM logs
-os.environ['WDM_LOG_LEVEL'] = '0'
+# Precompiled patterns (used on every law page)
+_DATE_RE = re.compile(r"(\d{1,2}\s+(?:gennaio|febbraio|marzo|aprile|maggio|giugno|luglio|agosto|settembre|ottobre|novembre|dicembre)\s+\d{4})", re.IGNORECASE)
+# Day / month / year captured in one scan (filename date)
+_DATE_PARTS_RE = re.compile(r"(\d{1,2})\s+(" + "|".join(ITALIAN_MONTHS) + r")\s+(\d{4})", re.IGNORECASE)
+_NUM_RE = re.compile(r"n\.\s*(\d+)", re.IGNORECASE)
+_URL_NUM_RE = re.compile(r"-(\d+)\.")
+_LR_RE = re.compile(r"lr(\d{4})-(\d+)")
+
+# One lxml parser for every law page (comments/PIs never reach the tree)
+_HTML_PARSER = lxml.html.HTMLParser(remove_comments=True, remove_pis=True)
 
 if not os.path.exists(OUTPUT_FOLDER):
     os.makedirs(OUTPUT_FOLDER)
 
 stats = {"Downloaded": 0, "Skipped": 0, "Failed": 0}
 
-def setup_driver():
-    """Initializes Headless Chrome."""
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--log-level=3")
-    chrome_options.add_argument("--window-size=1920,1080")
-    
-    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    
-    service = Service(ChromeDriverManager().install())
-    return webdriver.Chrome(service=service, options=chrome_options)
-
 def convert_date_for_filename(date_str):
     """Converts '9 dicembre 2025' -> '2025-12-09'."""
-    try:
-        date_str = re.sub(r'\s+', ' ', date_str.strip().lower())
-        for it_month, num_month in ITALIAN_MONTHS.items():
-            if it_month in date_str:
-                temp_date = date_str.replace(it_month, num_month)
-                dt_obj = datetime.strptime(temp_date, "%d %m %Y")
-                return dt_obj.strftime("%Y-%m-%d")
-        return "0000-00-00"
-    except Exception:
+    m = _DATE_PARTS_RE.search(date_str)
+    if not m:
         return "0000-00-00"
-
-def save_as_pdf(driver, filepath):
-    """Saves PDF via Chrome DevTools."""
-    try:
-        result = driver.execute_cdp_cmd("Page.printToPDF", {
-            "printBackground": True,
-            "paperWidth": 8.27, "paperHeight": 11.69,
-            "marginTop": 0.4, "marginBottom": 0.4,
-            "displayHeaderFooter": False
-        })
-        with open(filepath, "wb") as f:
-            f.write(base64.b64decode(result['data']))
-        return True
-    except Exception:
-        return False
-
-def extract_metadata(soup, url_text):
-    full_text = soup.get_text(" ", strip=True)
-    
-    # 1. LAW TITLE
-    law_title = "No Title Found"
-    tds = soup.find_all('td')
-    for td in tds:
-        txt = td.get_text(strip=True)
-        if len(txt) > 20 and not re.match(r'^\d', txt): 
-            law_title = txt
-            break 
+    d, mo, y = m.groups()
+    return f"{y}-{ITALIAN_MONTHS[mo.lower()]}-{int(d):02d}"
+
+def node_text(node):
+    """Same as BeautifulSoup's get_text(strip=True): stripped text pieces, joined."""
+    return "".join(t.strip() for t in node.itertext())
+
+def extract_metadata(doc, full_text, url_text):
+    # 1. LAW TITLE: first long cell that does not start with a digit
+    law_title = next(
+        (txt for txt in map(node_text, doc.iter('td'))
+         if len(txt) > 20 and not txt[:1].isdigit()),
+        "No Title Found"
+    )
     
     if law_title == "No Title Found":
-        header = soup.find(['h1', 'h2', 'h3'])
+        header = doc.xpath("(//h1 | //h2 | //h3)[1]")
         if header:
-            law_title = header.get_text(strip=True)
+            law_title = node_text(header[0])
 
     # 2. DATE
-    date_match = re.search(r"(\d{1,2}\s+(?:gennaio|febbraio|marzo|aprile|maggio|giugno|luglio|agosto|settembre|ottobre|novembre|dicembre)\s+\d{4})", full_text, re.IGNORECASE)
+    date_match = _DATE_RE.search(full_text)
     clean_date_text = date_match.group(1) if date_match else "Unknown Date"
 
     # 3. NUMBER
-    num_match = re.search(r"n\.\s*(\d+)", full_text, re.IGNORECASE)
+    num_match = _NUM_RE.search(full_text)
     if not num_match:
-        num_match = re.search(r"-(\d+)\.", url_text)
+        num_match = _URL_NUM_RE.search(url_text)
     law_num = num_match.group(1) if num_match else "Unknown"
 
     return law_title, law_num, clean_date_text
 
-def process_single_law(link_data):
-    driver = None
+async def process_single_law(context, sem, link_data):
+    """Opens the law in a tab of the shared browser, reads metadata, prints the PDF."""
     result_data = None
     status = "Failed"
 
-    try:
-        driver = setup_driver()
-        # Timeout settings
-        driver.set_page_load_timeout(TIMEOUT_SECONDS)
-        driver.set_script_timeout(TIMEOUT_SECONDS)
-
-        driver.get(link_data['url'])
-        
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        title, num, date_text = extract_metadata(soup, link_data['text'])
-
-        # Filename logic
-        filename_date = convert_date_for_filename(date_text)
-        region = "Umbria"
-        filename = f"{region}_{num}_{filename_date}.pdf"
-        filepath = os.path.join(OUTPUT_FOLDER, filename)
-
-        if not os.path.exists(filepath):
-            if save_as_pdf(driver, filepath):
+    async with sem:
+        page = await context.new_page()
+        try:
+            await page.goto(link_data['url'], timeout=TIMEOUT_SECONDS * 1000)
+            
+            full_text = await page.inner_text("body")
+            doc = lxml.html.fromstring(await page.content(), parser=_HTML_PARSER)
+            title, num, date_text = extract_metadata(doc, full_text, link_data['text'])
+
+            # Filename logic
+            filename_date = convert_date_for_filename(date_text)
+            region = "Umbria"
+            filename = f"{region}_{num}_{filename_date}.pdf"
+            filepath = os.path.join(OUTPUT_FOLDER, filename)
+
+            if not os.path.exists(filepath):
+                # Same A4 page and 0.4in top/bottom margins as the old printToPDF call
+                await page.pdf(path=filepath, format="A4", print_background=True,
+                               margin={"top": "0.4in", "bottom": "0.4in"})
                 status = "Downloaded"
             else:
-                status = "Failed"
-        else:
-            status = "Skipped"
-
-        result_data = {
-            "Region": region,
-            "Law Title": title,
-            "Law Number": num,
-            "Date": date_text,
-            "Filename": filename,
-            "URL": link_data['url']
-        }
-
-    except TimeoutException:
-        status = "Failed"
-    except Exception:
-        status = "Failed"
-    finally:
-        if driver:
-            try:
-                driver.quit()
-            except:
-                pass
+                status = "Skipped"
+
+            result_data = {
+                "Region": region,
+                "Law Title": title,
+                "Law Number": num,
+                "Date": date_text,
+                "Filename": filename,
+                "URL": link_data['url']
+            }
+
+        except Exception:
+            status = "Failed"
+        finally:
+            await page.close()
     
     return result_data, status
 
@@ -164,43 +128,33 @@ def get_all_links_sorted():
     print("🔍 Scanning main page for links...")
     try:
         resp = requests.get(START_URL, timeout=15)
-        soup = BeautifulSoup(resp.content, 'html.parser')
+        # Only <a href> nodes are built; lxml is the fast C parser
+        soup = BeautifulSoup(resp.content, 'lxml', parse_only=SoupStrainer('a', href=True))
         
-        links = []
+        # url -> entry: one pass does dedup (first occurrence wins, order kept) and the sort key
+        unique_links = {}
         for a in soup.find_all('a', href=True):
             if "mostra_atto.php" in a['href']:
                 full_url = BASE_URL + a['href'] if not a['href'].startswith('http') else a['href']
+                if full_url in unique_links:
+                    continue
                 
-                match = re.search(r"lr(\d{4})-(\d+)", full_url)
-                if match:
-                    year = int(match.group(1))
-                    num = int(match.group(2))
-                    sort_key = (year, num)
-                else:
-                    sort_key = (9999, 9999)
-
-                links.append({
+                match = _LR_RE.search(full_url)
+                sort_key = (int(match.group(1)), int(match.group(2))) if match else (9999, 9999)
+
+                unique_links[full_url] = {
                     "url": full_url, 
                     "text": a.text.strip(),
                     "sort_key": sort_key
-                })
-        
-        seen = set()
-        unique_links = []
-        for l in links:
-            if l['url'] not in seen:
-                unique_links.append(l)
-                seen.add(l['url'])
+                }
         
         print("📅 Sorting links by date (Year/Number)...")
-        unique_links.sort(key=lambda x: x['sort_key'])
-        
-        return unique_links
+        return sorted(unique_links.values(), key=itemgetter('sort_key'))
     except Exception as e:
         print(f"Error fetching list: {e}")
         return []
 
-def main():
+async def main():
     links = get_all_links_sorted()
     total_links = len(links)
     
@@ -209,40 +163,56 @@ def main():
         return
 
     print(f"📋 Found {total_links} laws. Starting sorted download...")
-    all_data = []
+    csv_path = os.path.join(OUTPUT_FOLDER, RESULTS_CSV)
+    saved_rows = 0
+
+    # One CSV row per law as results arrive (no full rewrite every few laws)
+    csv_file = open(csv_path, "w", newline="", encoding="utf-8")
+    csv_writer = csv.DictWriter(csv_file, fieldnames=COLUMNS)
+    csv_writer.writeheader()
 
     # Format dyal l-barr bash yban n9i (Clean Bar)
     bar_format = "{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}{postfix}]"
 
-    with tqdm(total=total_links, desc="Processing", position=0, bar_format=bar_format) as pbar:
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = []
-            for link in links:
-                futures.append(executor.submit(process_single_law, link))
+    try:
+        with tqdm(total=total_links, desc="Processing", position=0, bar_format=bar_format) as pbar:
+            # One browser and one context for the whole run; the semaphore caps open tabs
+            async with async_playwright() as p:
+                browser = await p.chromium.launch(headless=True)
+                context = await browser.new_context()
+                sem = asyncio.Semaphore(MAX_WORKERS)
+
+                tasks = [process_single_law(context, sem, link) for link in links]
             
-            for future in as_completed(futures):
-                try:
-                    data, status = future.result()
+                for coro in asyncio.as_completed(tasks):
+                    try:
+                        data, status = await coro
                     
-                    stats[status] += 1
-                    pbar.set_postfix(stats)
-                    pbar.update(1)
-
-                    if data:
-                        all_data.append(data)
-
-                    if len(all_data) % 5 == 0:
-                        df = pd.DataFrame(all_data)
-                        df.to_excel(os.path.join(OUTPUT_FOLDER, EXCEL_FILENAME), index=False)
-                except Exception:
-                    pbar.update(1)
-
-    if all_data:
-        df = pd.DataFrame(all_data)
-        df['SortDate'] = pd.to_datetime(df['Date'], errors='coerce', format='%d %B %Y') 
-        df.drop(columns=['SortDate'], errors='ignore', inplace=True)
-        df.to_excel(os.path.join(OUTPUT_FOLDER, EXCEL_FILENAME), index=False)
+                        stats[status] += 1
+                        pbar.set_postfix(stats)
+                        pbar.update(1)
+
+                        if data:
+                            csv_writer.writerow(data)
+                            csv_file.flush()
+                            saved_rows += 1
+                    except Exception:
+                        pbar.update(1)
+
+                await browser.close()
+    finally:
+        # Rows flushed so far stay readable even if the run dies
+        csv_file.close()
+
+    if saved_rows:
+        # CSV -> xlsx row by row; constant_memory flushes each row as it is written
+        wb = xlsxwriter.Workbook(os.path.join(OUTPUT_FOLDER, EXCEL_FILENAME), {'constant_memory': True})
+        ws = wb.add_worksheet()
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            for i, row in enumerate(csv.reader(f)):
+                ws.write_row(i, 0, row)
+        wb.close()
         print(f"\n✅ Success! Data saved to: {EXCEL_FILENAME}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
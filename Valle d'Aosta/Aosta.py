@@ -2,6 +2,7 @@ import os
 import re
 import asyncio
 import pandas as pd
+import xlsxwriter
 from playwright.async_api import async_playwright, TimeoutError
 from urllib.parse import urlparse, parse_qs, urljoin
 
@@ -14,9 +15,15 @@ EXCEL_FILE = "VDA_Laws_Data.xlsx"
 
 START_YEAR = 2025
 END_YEAR = 1950
-MAX_WORKERS = 3
+MAX_WORKERS = 3          # Concurrent download tabs
+MAX_COLLECT = 3          # Years listed concurrently
+QUEUE_SIZE = 50          # Collected laws waiting for a download worker
+LAW_LINK_SELECTOR = "a[href*='dettaglio?pk_lr=']"
 NAV_TIMEOUT = 15000      # Hard navigation timeout
 MAX_PAGES_PER_YEAR = 50  # Pagination safety guard
+SAVE_EVERY = 20          # Mid-year Excel flush interval (results)
+# Never needed for the text or the PDF. Stylesheets stay: page.pdf() needs the layout
+BLOCKED_RESOURCES = {"image", "font", "media", "websocket"}
 
 MONTH_MAP = {
     'gennaio': '01', 'febbraio': '02', 'marzo': '03', 'aprile': '04',
@@ -24,6 +31,24 @@ MONTH_MAP = {
     'settembre': '09', 'ottobre': '10', 'novembre': '11', 'dicembre': '12'
 }
 
+# Header patterns, compiled once: "15° gennaio 2023" and "n. 12" / "num. 5" / "numero 8"
+_DATE_RE = re.compile(
+    r'(\d{1,2}°?)\s+(gennaio|febbraio|marzo|aprile|maggio|giugno|luglio|agosto|settembre|ottobre|novembre|dicembre)\s+(\d{4})',
+    re.IGNORECASE
+)
+_NUM_RE = re.compile(r'(?:n\.|num\.|numero)\s*(\d+)', re.IGNORECASE)
+
+# Reads {href, header, title} for every result link in a single evaluate_all call
+LINK_ITEMS_JS = """
+els => els.map(e => {
+    const desc = document.evaluate(
+        "./following::p[contains(@class,'elemento_lista_paginata_banche_dati')][1]",
+        e, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+    ).singleNodeValue;
+    return {href: e.getAttribute('href'), header: e.textContent, title: desc ? desc.textContent : null};
+})
+"""
+
 # ================= ABROGATION DETECTION =================
 # These exact substrings indicate a law has been repealed/abrogated
 ABROGATION_INDICATORS = [
@@ -36,6 +61,10 @@ ABROGATION_INDICATORS = [
     "(Abrogata dal"
 ]
 
+# All indicators in one case-insensitive alternation: a single scan of the page text
+_ABROG_RE = re.compile("|".join(map(re.escape, ABROGATION_INDICATORS)), re.IGNORECASE)
+_APOS_TABLE = str.maketrans({"’": "'", "`": "'", "‘": "'"})
+
 # ================= UTILS =================
 
 def get_law_id(url):
@@ -58,25 +87,14 @@ def is_law_abrogated(page_text):
     Determine if a law has been abrogated.
     
     Includes normalization to handle:
-    1. Case sensitivity (converts to lowercase).
-    2. Smart/Curled Apostrophes (replaces ’ with ').
+    1. Case sensitivity (re.IGNORECASE, no lowercase copy of the text).
+    2. Smart/Curled Apostrophes (translated to ' in a single pass).
     """
     if not page_text:
         return False
     
-    # 1. Convert entire text to lowercase to match our indicators list
-    text_clean = page_text.lower()
-    
-    # 2. CRITICAL FIX: Replace "Smart Quotes" (’) with standard quotes (')
     # The website often uses typographic apostrophes which cause exact matches to fail
-    text_clean = text_clean.replace("’", "'").replace("`", "'").replace("‘", "'")
-    
-    # 3. Check for indicators in the cleaned text
-    for indicator in ABROGATION_INDICATORS:
-        if indicator in text_clean:
-            return True
-    
-    return False
+    return _ABROG_RE.search(page_text.translate(_APOS_TABLE)) is not None
 
 def parse_metadata(header_text):
     """
@@ -101,11 +119,7 @@ def parse_metadata(header_text):
 
     try:
         # Match Italian date format: "15° gennaio 2023"
-        date_match = re.search(
-            r'(\d{1,2}°?)\s+(gennaio|febbraio|marzo|aprile|maggio|giugno|luglio|agosto|settembre|ottobre|novembre|dicembre)\s+(\d{4})',
-            header_text,
-            re.IGNORECASE
-        )
+        date_match = _DATE_RE.search(header_text)
 
         if date_match:
             day_raw, month_txt, year = date_match.groups()
@@ -115,7 +129,7 @@ def parse_metadata(header_text):
             iso_date = f"{year}-{month_num}-{int(day):02d}"
 
         # Match law number: "n. 12", "num. 5", "numero 8"
-        num_match = re.search(r'(?:n\.|num\.|numero)\s*(\d+)', header_text, re.IGNORECASE)
+        num_match = _NUM_RE.search(header_text)
         if num_match:
             law_num = num_match.group(1)
 
@@ -124,9 +138,33 @@ def parse_metadata(header_text):
 
     return clean_date, iso_date, law_num
 
+async def block_heavy_resources(route):
+    """Route handler: aborts BLOCKED_RESOURCES, lets everything else through."""
+    if route.request.resource_type in BLOCKED_RESOURCES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def new_lean_context(browser):
+    """Browser context with heavy resources blocked on every page."""
+    context = await browser.new_context()
+    await context.route("**/*", block_heavy_resources)
+    return context
+
+def save_excel(all_results):
+    """Writes every result collected so far to EXCEL_FILE."""
+    cols = ['Region', 'Law Title', 'Law Number', 'Date', 'Filename', 'Status', 'URL']
+    # Rows go straight to disk in order (constant memory, no DataFrame rebuild)
+    wb = xlsxwriter.Workbook(EXCEL_FILE, {'constant_memory': True})
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, cols)
+    for i, row in enumerate(list(all_results), 1):
+        ws.write_row(i, 0, [row.get(c, "") for c in cols])
+    wb.close()
+
 # ================= CORE WORKER FUNCTION =================
 
-async def process_law(context, law_data, semaphore, all_results):
+async def process_law(context, law_data, all_results):
     """
     Process a single law with strict abrogation validation gate.
     
@@ -148,237 +186,262 @@ async def process_law(context, law_data, semaphore, all_results):
     Args:
         context: Playwright browser context for page creation
         law_data (dict): Contains url, title, number, date, filename
-        semaphore: Asyncio semaphore for concurrency limiting
         all_results (list): Thread-safe list for Excel data accumulation
         
     Returns:
         None: Modifies all_results list in-place
     """
-    async with semaphore:
-        page = await context.new_page()
-
-        link = law_data['url']
-        filename = law_data['filename']
-        filepath = os.path.join(OUTPUT_DIR, filename)
-
-        # Prepare result dictionary (only saved for non-abrogated laws)
-        result = {
-            'Region': "Valle d'Aosta",
-            'Law Title': law_data['title'],
-            'Law Number': law_data['number'],
-            'Date': law_data['date'],
-            'Filename': filename,
-            'Status': 'Failed',
-            'URL': link
-        }
+    page = await context.new_page()
+
+    link = law_data['url']
+    filename = law_data['filename']
+    filepath = os.path.join(OUTPUT_DIR, filename)
+
+    # Prepare result dictionary (only saved for non-abrogated laws)
+    result = {
+        'Region': "Valle d'Aosta",
+        'Law Title': law_data['title'],
+        'Law Number': law_data['number'],
+        'Date': law_data['date'],
+        'Filename': filename,
+        'Status': 'Failed',
+        'URL': link
+    }
 
-        try:
-            # ═══════════════════════════════════════════════════════
-            # PHASE 1: NAVIGATION & TEXT EXTRACTION
-            # ═══════════════════════════════════════════════════════
-            await page.goto(link, wait_until="domcontentloaded", timeout=NAV_TIMEOUT)
-            await page.wait_for_timeout(300)  # Allow dynamic content to render
-
-            # Extract complete page text for abrogation analysis
-            page_text = await page.evaluate("() => document.body.innerText")
-
-            # ═══════════════════════════════════════════════════════
-            # PHASE 2: ABROGATION VALIDATION (CRITICAL GATE)
-            # ═══════════════════════════════════════════════════════
-            if is_law_abrogated(page_text):
-                # Law is abrogated - immediate termination without download
-                
-                law_id = f"{law_data['title'][:60]}... (#{law_data['number']})"
-                print(f"  ⊘ Skipping abrogated law: {law_id}")
-                
-                # Cleanup: Remove PDF if exists from previous runs (before filter was added)
-                if os.path.exists(filepath):
-                    try:
-                        os.remove(filepath)
-                        print(f"     └─ Deleted old PDF: {filename}")
-                    except Exception as del_err:
-                        print(f"     └─ Could not delete {filename}: {del_err}")
-                
-                # CRITICAL: Early return - prevent download and Excel entry
-                await page.close()
-                return
+    try:
+        # ═══════════════════════════════════════════════════════
+        # PHASE 1: NAVIGATION & TEXT EXTRACTION
+        # ═══════════════════════════════════════════════════════
+        await page.goto(link, wait_until="domcontentloaded", timeout=NAV_TIMEOUT)
+        # Ready once the body has text to check (no fixed sleep)
+        await page.wait_for_function(
+            "() => document.body && document.body.innerText.trim().length > 0", timeout=NAV_TIMEOUT
+        )
+
+        # Extract complete page text for abrogation analysis
+        page_text = await page.evaluate("() => document.body.innerText")
+
+        # ═══════════════════════════════════════════════════════
+        # PHASE 2: ABROGATION VALIDATION (CRITICAL GATE)
+        # ═══════════════════════════════════════════════════════
+        if is_law_abrogated(page_text):
+            # Law is abrogated - immediate termination without download
             
-            # ═══════════════════════════════════════════════════════
-            # PHASE 3: VALID LAW PROCESSING (Only reached if NOT abrogated)
-            # ═══════════════════════════════════════════════════════
+            law_id = f"{law_data['title'][:60]}... (#{law_data['number']})"
+            print(f"  ⊘ Skipping abrogated law: {law_id}")
             
-            # Check if PDF already exists (avoid re-downloading)
+            # Cleanup: Remove PDF if exists from previous runs (before filter was added)
             if os.path.exists(filepath):
-                result['Status'] = 'Skipped'
-                all_results.append(result)
-                await page.close()
-                return
-
-            # ═══════════════════════════════════════════════════════
-            # PHASE 4: PDF DOWNLOAD (Only for valid, new laws)
-            # ═══════════════════════════════════════════════════════
+                try:
+                    os.remove(filepath)
+                    print(f"     └─ Deleted old PDF: {filename}")
+                except Exception as del_err:
+                    print(f"     └─ Could not delete {filename}: {del_err}")
             
-            # Disable browser print dialog (prevents popup interference)
-            await page.evaluate("window.print = function() {}")
-
-            # Attempt to trigger print-optimized layout
-            try:
-                btn = page.locator("button[onclick*='window.print']")
-                if await btn.count() > 0:
-                    await btn.click(timeout=2000)
-                    await page.wait_for_timeout(500)
-            except:
-                pass  # Print button optional - continue without it
-
-            # Generate PDF file
-            await page.pdf(path=filepath, format="A4", print_background=True)
-            result['Status'] = 'Downloaded'
+            # CRITICAL: Early return - prevent download and Excel entry
+            await page.close()
+            return
+        
+        # ═══════════════════════════════════════════════════════
+        # PHASE 3: VALID LAW PROCESSING (Only reached if NOT abrogated)
+        # ═══════════════════════════════════════════════════════
+        
+        # Check if PDF already exists (avoid re-downloading)
+        if os.path.exists(filepath):
+            result['Status'] = 'Skipped'
             all_results.append(result)
+            await page.close()
+            return
 
-        except Exception as e:
-            result['Status'] = f"Error: {e}"
-            all_results.append(result)
+        # ═══════════════════════════════════════════════════════
+        # PHASE 4: PDF DOWNLOAD (Only for valid, new laws)
+        # ═══════════════════════════════════════════════════════
+        
+        # Disable browser print dialog (prevents popup interference)
+        await page.evaluate("window.print = function() {}")
 
-        finally:
+        # Attempt to trigger print-optimized layout
+        try:
+            btn = page.locator("button[onclick*='window.print']")
+            if await btn.count() > 0:
+                await btn.click(timeout=2000)
+                # Let any print-layout requests settle before printing
+                await page.wait_for_load_state("networkidle", timeout=2000)
+        except:
+            pass  # Print button optional - continue without it
 
-            await page.close()
+        # Generate PDF file
+        await page.pdf(path=filepath, format="A4", print_background=True)
+        result['Status'] = 'Downloaded'
+        all_results.append(result)
 
-# ================= MAIN ORCHESTRATION =================
+    except Exception as e:
+        result['Status'] = f"Error: {e}"
+        all_results.append(result)
 
-async def main():
-    """
-    Main scraping orchestration with year-by-year processing.
-    
-    Architecture:
-    - Single browser instance shared across all years
-    - Context refresh every 5 years (prevents memory leaks)
-    - Sequential year processing (2025 → 1950)
-    - Concurrent law processing within each year (MAX_WORKERS=3)
-    - Incremental Excel saves after each year (crash recovery)
+    finally:
+
+        await page.close()
+
+# ================= PIPELINE STAGES =================
+
+async def collect_year(year, browser, queue):
     """
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    all_results = []
+    Producer: walks one year's search result pages and queues its laws.
 
-    # Load existing Excel data for resume capability
-    if os.path.exists(EXCEL_FILE):
-        try:
-            all_results = pd.read_excel(EXCEL_FILE).to_dict('records')
-        except:
-            pass
+    Each year gets its own short-lived context (closed when the year is done),
+    so up to MAX_COLLECT years can be listed while downloads keep running.
+    """
+    context = await new_lean_context(browser)
+    page = await context.new_page()
+    seen_urls = set()  # O(1) duplicate check across result pages
+    page_num = 1
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context()
-
-        for idx, year in enumerate(range(START_YEAR, END_YEAR - 1, -1)):
-            print(f"\n--- Scanning Year {year} ---")
-
-            # Refresh context every 5 years (prevents slowdown)
-            if idx > 0 and idx % 5 == 0:
-                await context.close()
-                context = await browser.new_context()
-
-            page = await context.new_page()
-            laws_to_process = []
-            page_num = 1
-
-            # ═══════════════════════════════════════════════════════
-            # COLLECTION PHASE: Scrape search results for law URLs
-            # ═══════════════════════════════════════════════════════
-            while True:
-                if page_num > MAX_PAGES_PER_YEAR:
-                    print(f"Pagination stop safeguard for {year}")
-                    break
+    try:
+        while True:
+            if page_num > MAX_PAGES_PER_YEAR:
+                print(f"Pagination stop safeguard for {year}")
+                break
 
-                url = f"{SEARCH_URL}?tipo=&numero_legge=&anno={year}&ricerca_in=1&pagina={page_num}"
+            url = f"{SEARCH_URL}?tipo=&numero_legge=&anno={year}&ricerca_in=1&pagina={page_num}"
 
+            try:
+                await page.goto(url, wait_until="domcontentloaded", timeout=NAV_TIMEOUT)
+                # Results are server-rendered; the short timeout only applies past the last page
                 try:
-                    await page.goto(url, wait_until="domcontentloaded", timeout=NAV_TIMEOUT)
-                    await page.wait_for_timeout(400)
+                    await page.wait_for_selector(LAW_LINK_SELECTOR, state="attached", timeout=2000)
+                except TimeoutError:
+                    pass
 
-                    link_elements = page.locator("a[href*='dettaglio?pk_lr=']")
-                    count = await link_elements.count()
+                # href, header and description of every result in one round trip;
+                # the description is the first following <p> of the listing
+                items = await page.locator(LAW_LINK_SELECTOR).evaluate_all(LINK_ITEMS_JS)
 
-                    if count == 0:
-                        break
+                if not items:
+                    break
 
-                    new_found = False
+                new_found = False
 
-                    for i in range(count):
-                        el = link_elements.nth(i)
-                        raw_href = await el.get_attribute("href")
-                        full_url = urljoin(page.url, raw_href)
+                for item in items:
+                    full_url = urljoin(page.url, item['href'])
 
-                        header_text = (await el.text_content() or "").strip()
+                    header_text = (item['header'] or "").strip()
+                    title_text = item['title'] if item['title'] is not None else header_text
 
-                        desc_loc = el.locator(
-                            "xpath=./following::p[contains(@class,'elemento_lista_paginata_banche_dati')][1]"
-                        )
-                        title_text = (await desc_loc.text_content() if await desc_loc.count() else header_text)
+                    clean_date, iso_date, law_num = parse_metadata(header_text)
+                    pk_id = get_law_id(full_url)
 
-                        clean_date, iso_date, law_num = parse_metadata(header_text)
-                        pk_id = get_law_id(full_url)
+                    filename = (
+                        f"ValleAosta_{law_num}_{iso_date}.pdf"
+                        if iso_date != "0000-00-00"
+                        else f"ValleAosta_ID_{pk_id}.pdf"
+                    )
 
-                        filename = (
-                            f"ValleAosta_{law_num}_{iso_date}.pdf"
-                            if iso_date != "0000-00-00"
-                            else f"ValleAosta_ID_{pk_id}.pdf"
-                        )
+                    if full_url not in seen_urls:
+                        seen_urls.add(full_url)
+                        # Blocks while the queue is full: downloads set the pace
+                        await queue.put({
+                            'url': full_url,
+                            'date': clean_date,
+                            'number': law_num,
+                            'title': title_text.strip()[:1000],
+                            'filename': filename
+                        })
+                        new_found = True
 
-                        if not any(l['url'] == full_url for l in laws_to_process):
-                            laws_to_process.append({
-                                'url': full_url,
-                                'date': clean_date,
-                                'number': law_num,
-                                'title': title_text.strip()[:1000],
-                                'filename': filename
-                            })
-                            new_found = True
+                if not new_found and page_num > 1:
+                    break
 
-                    if not new_found and page_num > 1:
-                        break
+                page_num += 1
 
-                    page_num += 1
+            except TimeoutError:
+                print(f"Timeout year {year} page {page_num} → skipping page")
+                page_num += 1
+                continue
 
-                except TimeoutError:
-                    print(f"Timeout year {year} page {page_num} → skipping page")
-                    page_num += 1
-                    continue
+            except Exception as e:
+                print(f"Pagination error {year} page {page_num}: {e}")
+                page_num += 1
+                continue
+    finally:
+        await context.close()
+
+    if seen_urls:
+        print(f"✓ Year {year}: queued {len(seen_urls)} laws")
+    else:
+        print(f"No laws found for {year}")
+
+async def download_worker(context, queue, all_results, counters):
+    """Consumer: validates and prints queued laws until cancelled."""
+    while True:
+        law = await queue.get()
+        try:
+            await process_law(context, law, all_results)
+            counters['done'] += 1
+            # Periodic flush for crash recovery
+            if counters['done'] % SAVE_EVERY == 0:
+                save_excel(all_results)
+        except Exception as e:
+            print(f"Worker error: {e}")
+        finally:
+            queue.task_done()
 
-                except Exception as e:
-                    print(f"Pagination error {year} page {page_num}: {e}")
-                    page_num += 1
-                    continue
+# ================= MAIN ORCHESTRATION =================
 
-            await page.close()
+async def main():
+    """
+    Main scraping orchestration as a collect -> download pipeline.
+    
+    Architecture:
+    - Single browser instance shared across all years
+    - Up to MAX_COLLECT years listed concurrently (2025 → 1950), each in a fresh context
+    - MAX_WORKERS download workers fed from a bounded queue, running the whole time
+    - Incremental Excel saves every SAVE_EVERY laws and at the end (crash recovery)
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    all_results = []
 
-            if not laws_to_process:
-                print(f"No laws found for {year}")
-                continue
+    # Load existing Excel data for resume capability
+    if os.path.exists(EXCEL_FILE):
+        try:
+            # Empty cells come back as NaN, which xlsxwriter cannot write
+            all_results = pd.read_excel(EXCEL_FILE).fillna("").to_dict('records')
+        except:
+            pass
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await new_lean_context(browser)
+
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        counters = {'done': 0}
+        workers = [
+            asyncio.create_task(download_worker(context, queue, all_results, counters))
+            for _ in range(MAX_WORKERS)
+        ]
 
-            print(f"Found {len(laws_to_process)} laws → downloading")
+        collect_sem = asyncio.Semaphore(MAX_COLLECT)
 
-            # ═══════════════════════════════════════════════════════
-            # PROCESSING PHASE: Concurrent law validation & download
-            # ═══════════════════════════════════════════════════════
-            sem = asyncio.Semaphore(MAX_WORKERS)
-            tasks = [process_law(context, law, sem, all_results) for law in laws_to_process]
-            await asyncio.gather(*tasks)
+        async def collect_with_limit(year):
+            async with collect_sem:
+                print(f"\n--- Scanning Year {year} ---")
+                try:
+                    await collect_year(year, browser, queue)
+                except Exception as e:
+                    # One broken year must not stop the others
+                    print(f"Collection failed for {year}: {e}")
 
-            # ═══════════════════════════════════════════════════════
-            # PERSISTENCE PHASE: Save results after each year
-            # ═══════════════════════════════════════════════════════
-            df = pd.DataFrame(all_results)
-            cols = ['Region', 'Law Title', 'Law Number', 'Date', 'Filename', 'Status', 'URL']
-            for c in cols:
-                if c not in df.columns:
-                    df[c] = ""
+        await asyncio.gather(*(collect_with_limit(y) for y in range(START_YEAR, END_YEAR - 1, -1)))
 
-            df[cols].to_excel(EXCEL_FILE, index=False)
-            print(f"✓ Saved year {year}")
+        # Every law is queued: wait for the downloads to drain, then stop the workers
+        await queue.join()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
 
+        save_excel(all_results)
         await browser.close()
         print("\n--- ALL YEARS COMPLETED ---")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+import os
+import json
+import shutil
+import threading
+
+# Shared by the requests-based scrapers (Sardinia, Trentino-Alto Adige):
+# conditional GET + Range resume backed by a JSON sidecar of validators per PDF URL.
+
+COPY_CHUNK = 1 << 18  # 256 KiB per read/write when streaming a PDF to disk
+_INDEX_LOCK = threading.Lock()
+
+def load_download_index(index_file):
+    """URL -> {etag, last_modified, length, complete} recorded by previous runs."""
+    try:
+        with open(index_file, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_index(index, index_file):
+    tmp_path = index_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_file)
+
+def record_download(index, index_file, href, response):
+    """Stores the validators before the body is streamed (entry stays incomplete until mark_complete)."""
+    total = response.headers.get("Content-Length")
+    if response.status_code == 206:
+        # Content-Range: bytes start-end/total
+        total = response.headers.get("Content-Range", "").rpartition("/")[2]
+    entry = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "length": int(total) if total and total.isdigit() else None,
+        "complete": False
+    }
+    with _INDEX_LOCK:
+        index[href] = entry
+        _save_index(index, index_file)
+
+def mark_complete(index, index_file, href, path):
+    """Called after the copy: flags the entry complete unless the file is shorter than announced."""
+    size = os.path.getsize(path)
+    with _INDEX_LOCK:
+        entry = index.get(href)
+        if entry is None:
+            return False
+        if entry.get("length") is not None and size < entry["length"]:
+            return False  # Connection closed early: the next run resumes with Range
+        entry["complete"] = True
+        entry["length"] = size
+        _save_index(index, index_file)
+        return True
+
+def conditional_headers(entry, path):
+    """Range header to resume a partial file, validators to revalidate a complete one, or {} to refetch."""
+    if not entry or not os.path.exists(path):
+        return {}
+    size = os.path.getsize(path)
+    length = entry.get("length")
+    # Entries from older indexes carry no flag: trust them only when the length is known
+    complete = entry.get("complete", length is not None)
+    if length and size < length:
+        headers = {"Range": f"bytes={size}-"}
+        validator = entry.get("etag") or entry.get("last_modified")
+        if validator: headers["If-Range"] = validator
+        return headers
+    if not complete and (length is None or size != length):
+        return {}  # Interrupted with no usable length: fetch the whole file again
+    headers = {}
+    if entry.get("etag"): headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"): headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+def download_one(session, href, path, index, index_file, require_pdf=False):
+    """Downloads, resumes or revalidates one PDF. Returns the status for the metadata row."""
+    try:
+        headers = conditional_headers(index.get(href), path)
+        with session.get(href, headers=headers, stream=True, timeout=30) as r:
+            if r.status_code == 304:
+                return "Skipped (Not Modified)"
+            if r.status_code not in (200, 206):
+                return f"Failed ({r.status_code})"
+            if require_pdf and 'application/pdf' not in r.headers.get('Content-Type', ''):
+                return f"Failed ({r.status_code})"
+            record_download(index, index_file, href, r)
+            # 206 continues the partial file; a full 200 (changed, or Range ignored) rewrites it
+            r.raw.decode_content = True
+            with open(path, 'ab' if r.status_code == 206 else 'wb') as f:
+                shutil.copyfileobj(r.raw, f, length=COPY_CHUNK)
+        if not mark_complete(index, index_file, href, path):
+            return "Failed (Truncated)"
+        return "Resumed" if r.status_code == 206 else "Downloaded"
+    except Exception:
+        return "Failed"
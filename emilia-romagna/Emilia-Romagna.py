@@ -1,10 +1,19 @@
 import os
 import re
+import csv
 import time
+import shutil
+import functools
+import threading
+import queue
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from datetime import datetime
 
@@ -13,8 +22,14 @@ BASE_URL = "https://demetra.regione.emilia-romagna.it/al/"
 START_URL = "https://demetra.regione.emilia-romagna.it/al/hit-page?id_wgt=query_lr&hlist=first&src=1&src_f=1"
 OUTPUT_DIR = "Downloaded_Laws"
 EXCEL_FILENAME = "Emilia_Romagna_Laws.xlsx"
-MAX_WORKERS = 5  # Number of parallel downloads
-SAVE_INTERVAL = 10  # Save Excel every N items
+RESULTS_CSV = "Emilia_Romagna_Laws.csv"  # Appended per finished row (crash-safe), converted to EXCEL_FILENAME at the end
+MAX_WORKERS = min(32, (os.cpu_count() or 4) * 4)  # Upper bound on parallel downloads
+MIN_WORKERS = 2  # The adaptive cap never drops below this
+RECOVER_AFTER = 20  # Clean downloads needed to give one slot back
+COPY_CHUNK = 1 << 18  # 256 KiB per read/write when streaming PDFs
+RESUME_ATTEMPTS = 3  # Range-resume attempts per PDF
+MAX_IN_FLIGHT = MAX_WORKERS * 4  # Submitted-but-unfinished downloads before page scanning waits
+COLUMNS = ["Region", "Law Title", "Law Number", "Date", "Filename", "Status"]
 
 # Italian Month Mapping
 MONTH_MAP = {
@@ -23,6 +38,12 @@ MONTH_MAP = {
     'settembre': '09', 'ottobre': '10', 'novembre': '11', 'dicembre': '12'
 }
 
+# Precompiled patterns
+_ILLEGAL_FN = re.compile(r'[\\/*?:"<>|]')
+_ER_LAW_RE = re.compile(r'Legge regionale\s+(.*?),\s+n\.(\d+)', re.IGNORECASE)
+# "25 luglio 2025" (a trailing "," or "." after the year is ignored)
+_IT_DATE_RE = re.compile(r'^\s*(\d{1,2})°?\s+(' + '|'.join(MONTH_MAP) + r')\s+(\d{4})\b', re.IGNORECASE)
+
 # --- HELPER FUNCTIONS ---
 
 def parse_italian_date(date_str):
@@ -30,54 +51,158 @@ def parse_italian_date(date_str):
     Converts '25 luglio 2025' to ('2025-07-25', '25 luglio 2025')
     Returns: (formatted_date_for_filename, clean_date_for_excel)
     """
-    try:
-        # Clean up string
-        clean_date = date_str.strip()
-        parts = clean_date.split()
-        
-        if len(parts) >= 3:
-            day = parts[0].zfill(2)
-            month_txt = parts[1].lower()
-            year = parts[2]
-            
-            # Remove comma if present in year (e.g. "2025,")
-            year = year.replace(',', '').replace('.', '')
-            
-            if month_txt in MONTH_MAP:
-                month_num = MONTH_MAP[month_txt]
-                formatted_date = f"{year}-{month_num}-{day}"
-                return formatted_date, f"{day} {month_txt} {year}"
-                
-    except Exception:
-        pass
-    
+    m = _IT_DATE_RE.match(date_str or "")
+    if m:
+        day, month_txt, year = m.groups()
+        day, month_txt = day.zfill(2), month_txt.lower()
+        return f"{year}-{MONTH_MAP[month_txt]}-{day}", f"{day} {month_txt} {year}"
+
     # Fallback if parsing fails
     return "0000-00-00", date_str
 
 def clean_filename(text):
     """Removes illegal characters from filenames."""
-    return re.sub(r'[\\/*?:"<>|]', "", text)
+    return _ILLEGAL_FN.sub("", text)
+
+# Adaptive download cap: shrinks when the server pushes back (429/503), grows back on clean runs
+DOWNLOAD_SLOTS = {"limit": MAX_WORKERS, "active": 0, "clean": 0, "cond": threading.Condition()}
+
+def acquire_slot():
+    slots = DOWNLOAD_SLOTS
+    with slots["cond"]:
+        while slots["active"] >= slots["limit"]:
+            slots["cond"].wait()
+        slots["active"] += 1
 
-def download_file(url, filepath, pbar_dl):
-    """Downloads a file and updates the progress bar."""
+def release_slot(status_code):
+    slots = DOWNLOAD_SLOTS
+    with slots["cond"]:
+        slots["active"] -= 1
+        if status_code in (429, 503):
+            slots["limit"] = max(MIN_WORKERS, slots["limit"] - 1)
+            slots["clean"] = 0
+        elif status_code in (200, 206):
+            slots["clean"] += 1
+            if slots["clean"] >= RECOVER_AFTER and slots["limit"] < MAX_WORKERS:
+                slots["limit"] += 1
+                slots["clean"] = 0
+        slots["cond"].notify_all()
+
+def read_validator(path):
+    """ETag or Last-Modified stored next to a .part file, or None."""
     try:
-        if os.path.exists(filepath):
-            pbar_dl.update(1)
-            return "Skipped (Exists)"
-
-        response = requests.get(url, stream=True, timeout=30)
-        if response.status_code == 200:
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            pbar_dl.update(1)
-            return "Downloaded"
-        else:
-            pbar_dl.update(1)
-            return f"Failed (Status {response.status_code})"
-    except Exception as e:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def write_validator(path, response):
+    """Stores the validator of a fresh body; weak ETags are not allowed in If-Range."""
+    etag = response.headers.get('ETag')
+    validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
+    if validator:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(validator)
+    else:
+        remove_validator(path)
+
+def remove_validator(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def download_file(session, url, filepath, pbar_dl):
+    """Downloads a file (resuming a leftover .part via HTTP Range) and updates the progress bar."""
+    if os.path.exists(filepath):
         pbar_dl.update(1)
-        return f"Failed ({str(e)})"
+        return "Skipped (Exists)"
+
+    part_path = filepath + ".part"
+    validator_path = part_path + ".validator"
+    result = "Failed"
+    for attempt in range(RESUME_ATTEMPTS):
+        if attempt:
+            time.sleep(2 ** attempt)  # Exponential backoff before resuming
+
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        # PDFs are already compressed: ask for the raw bytes (Range offsets are then file offsets)
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            validator = read_validator(validator_path)
+            if validator:
+                # If-Range: the server sends the missing tail only if the file is unchanged, else a full 200
+                headers['Range'] = f"bytes={offset}-"
+                headers['If-Range'] = validator
+            else:
+                offset = 0  # No validator for this partial: splicing could mix two versions
+
+        status_code = None
+        response = None
+        acquire_slot()
+        try:
+            response = session.get(url, stream=True, timeout=30, headers=headers)
+            status_code = response.status_code
+            if status_code == 416 and offset:
+                # Partial no longer matches the remote file: start over
+                os.remove(part_path)
+                remove_validator(validator_path)
+                result = "Failed (Status 416)"
+                continue
+            if status_code not in (200, 206):
+                result = f"Failed (Status {status_code})"
+                break
+
+            # 206 appends to the partial; 200 means the file changed or Range was ignored, so rewrite it
+            mode = os.O_APPEND if status_code == 206 and offset else os.O_TRUNC
+            if mode == os.O_TRUNC:
+                write_validator(validator_path, response)
+            # Large raw copies instead of an 8 KiB Python loop (still honours Content-Encoding)
+            response.raw.read = functools.partial(response.raw.read, decode_content=True)
+            # Wrapped straight away so the descriptor is closed even if the advice below fails
+            with os.fdopen(os.open(part_path, os.O_WRONLY | os.O_CREAT | mode), 'wb') as f:
+                if hasattr(os, 'posix_fadvise'):
+                    try:
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                    except OSError:
+                        pass  # Only a hint: some filesystems reject it
+                shutil.copyfileobj(response.raw, f, length=COPY_CHUNK)
+            os.replace(part_path, filepath)
+            remove_validator(validator_path)
+            result = "Downloaded"
+            break
+        except Exception as e:
+            # Whatever reached the .part file is kept for the next attempt
+            result = f"Failed ({str(e)})"
+        finally:
+            # Streamed bodies must be closed on every path to return the connection to the pool
+            if response is not None:
+                response.close()
+            release_slot(status_code)
+
+    pbar_dl.update(1)
+    return result
+
+def save_excel():
+    """Converts RESULTS_CSV to EXCEL_FILENAME through a write-only workbook (saved once). Returns row count."""
+    with open(RESULTS_CSV, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Header row is rewritten in bold
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Laws")
+        header = []
+        for name in COLUMNS:
+            cell = WriteOnlyCell(ws, value=name)
+            cell.font = Font(bold=True)
+            header.append(cell)
+        ws.append(header)
+        count = 0
+        for row in reader:
+            ws.append(row)
+            count += 1
+    if count:
+        wb.save(EXCEL_FILENAME)
+    return count
 
 # --- MAIN SCRAPER ---
 
@@ -89,9 +214,20 @@ def main():
     session.headers.update({
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     })
+    # Pooled keep-alive connections shared by page fetches and PDF downloads
+    adapter = HTTPAdapter(
+        pool_connections=MAX_WORKERS,
+        pool_maxsize=MAX_WORKERS + 1,  # Download threads + the page fetcher
+        # raise_on_status=False hands the final 429/503 back so the cap can shrink
+        max_retries=Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
 
-    # Data storage
-    all_data = []
+    # Data storage: every finished row is appended (and flushed) to RESULTS_CSV right away
+    csv_file = open(RESULTS_CSV, "w", newline="", encoding="utf-8")
+    csv_writer = csv.DictWriter(csv_file, fieldnames=COLUMNS)
+    csv_writer.writeheader()
     
     # Progress Bars
     # We don't know the total pages initially, so we use total=None for pages
@@ -99,23 +235,64 @@ def main():
     pbar_scrape = tqdm(desc="Laws Found   ", unit="law", position=1)
     pbar_dl = tqdm(desc="PDFs Processed ", unit="file", position=2)
 
-    current_url = START_URL
     page_count = 0
+    # Files already on disk, listed once: skips never reach the download pool
+    existing = set(os.listdir(OUTPUT_DIR))
     
     # Executor for parallel downloads
     executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
-    future_to_data = {}
+    # Bounded window: page scanning waits instead of queueing the whole archive
+    in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+    done_q = queue.Queue()
+    # Single-slot prefetcher: the next listing downloads while this one is processed
+    page_fetcher = ThreadPoolExecutor(max_workers=1)
+    next_page = page_fetcher.submit(session.get, START_URL, timeout=30)
+
+    def on_done(f, data):
+        """Done-callback: hands the finished row to the writer thread."""
+        in_flight.release()
+        try:
+            status = f.result()
+        except Exception as e:
+            status = f"Failed ({str(e)})"
+        done_q.put((data, status))
+
+    def write_results():
+        """Only thread touching the results CSV; stops on None."""
+        while True:
+            item = done_q.get()
+            if item is None:
+                break
+            data, status = item
+            data['Status'] = status
+            csv_writer.writerow(data)
+            csv_file.flush()
+
+    writer = threading.Thread(target=write_results, daemon=True)
+    writer.start()
 
     try:
-        while current_url:
+        while next_page:
             page_count += 1
             try:
-                response = session.get(current_url)
-                soup = BeautifulSoup(response.content, 'html.parser')
+                response = next_page.result()
+                soup = BeautifulSoup(response.content, 'lxml')
             except Exception as e:
                 tqdm.write(f"Error fetching page: {e}")
                 break
 
+            # --- PAGINATION (PREFETCH) ---
+            # Look for "Succ. >>" and start fetching it before handling this page's laws
+            # <a href="..." ... > Succ. >></a>
+            next_link = soup.select_one('a:-soup-contains("Succ.")')
+            
+            if next_link:
+                next_href = next_link.get('href')
+                next_page = page_fetcher.submit(session.get, BASE_URL + next_href, timeout=30)
+                pbar_pages.update(1)
+            else:
+                next_page = None # Stop loop
+
             # Find law items (Assuming rows are in a standard table or div structure)
             # Based on the HTML snippet provided, we look for the download links directly 
             # or the container. Usually, these are in a table or list.
@@ -123,7 +300,7 @@ def main():
             
             # Strategy: Find all 'Access document' buttons
             # Selector based on user snippet: class="hitelement_button"
-            download_links = soup.find_all('a', class_='hitelement_button', title=True)
+            download_links = soup.select('a.hitelement_button[title]')
             
             if not download_links:
                 tqdm.write("No documents found on this page.")
@@ -144,7 +321,7 @@ def main():
                 # Regex to extract Date and Number
                 # Matches: "Legge regionale 25 luglio 2025, n.9"
                 # Pattern: Date (group 1), Number (group 2)
-                match = re.search(r'Legge regionale\s+(.*?),\s+n\.(\d+)', full_text, re.IGNORECASE)
+                match = _ER_LAW_RE.search(full_text)
                 
                 if match:
                     raw_date = match.group(1) # "25 luglio 2025"
@@ -177,65 +354,40 @@ def main():
                     "Status": "Pending"
                 }
                 
-                # Submit download task
-                future = executor.submit(download_file, pdf_url, filepath, pbar_dl)
-                future_to_data[future] = row_data
+                if filename in existing:
+                    pbar_dl.update(1)
+                    done_q.put((row_data, "Skipped (Exists)"))
+                    continue
+                existing.add(filename)
 
-            # --- PROCESS FINISHED DOWNLOADS (BATCH UPDATE) ---
-            # We check for completed futures periodically to update the Excel list
-            done_futures = [f for f in future_to_data if f.done() and not future_to_data[f].get('processed')]
-            
-            for f in done_futures:
-                result_status = f.result()
-                data = future_to_data[f]
-                data['Status'] = result_status
-                data['processed'] = True # Mark as handled
-                all_data.append(data)
-
-            # Save Excel periodically
-            if len(all_data) % SAVE_INTERVAL == 0 and len(all_data) > 0:
-                df = pd.DataFrame(all_data)
-                # Remove internal flag
-                save_df = df.drop(columns=['processed'], errors='ignore')
-                save_df.to_excel(EXCEL_FILENAME, index=False)
-
-            # --- PAGINATION ---
-            # Look for "Succ. >>"
-            # <a href="..." ... > Succ. >></a>
-            next_link = soup.find('a', string=re.compile(r'Succ\.'))
-            
-            if next_link:
-                next_href = next_link.get('href')
-                current_url = BASE_URL + next_href
-                pbar_pages.update(1)
-            else:
-                current_url = None # Stop loop
+                # Submit download task
+                in_flight.acquire()
+                future = executor.submit(download_file, session, pdf_url, filepath, pbar_dl)
+                future.add_done_callback(lambda f, d=row_data: on_done(f, d))
 
     except KeyboardInterrupt:
         tqdm.write("\nProcess interrupted by user. Saving current progress...")
 
-    # --- FINAL CLEANUP ---
-    tqdm.write("\nWaiting for remaining downloads to complete...")
-    for f in as_completed(future_to_data):
-        if not future_to_data[f].get('processed'):
-            data = future_to_data[f]
-            data['Status'] = f.result()
-            all_data.append(data)
-
-    # Final Save
-    if all_data:
-        df = pd.DataFrame(all_data)
-        if 'processed' in df.columns:
-            df = df.drop(columns=['processed'])
-        df.to_excel(EXCEL_FILENAME, index=False)
-        tqdm.write(f"\nCompleted. Data saved to {EXCEL_FILENAME}")
-    else:
-        tqdm.write("No data found.")
+    finally:
+        # --- FINAL CLEANUP (also on errors: rows already in RESULTS_CSV survive a hard kill) ---
+        tqdm.write("\nWaiting for remaining downloads to complete...")
+        # Manual cancel instead of shutdown(cancel_futures=True), which needs Python 3.9
+        next_page.cancel()
+        page_fetcher.shutdown(wait=True)
+        executor.shutdown(wait=True)
+        done_q.put(None)
+        writer.join()
+        csv_file.close()
+
+        # Final Save
+        if save_excel():
+            tqdm.write(f"\nCompleted. Data saved to {EXCEL_FILENAME}")
+        else:
+            tqdm.write("No data found.")
 
-    pbar_pages.close()
-    pbar_scrape.close()
-    pbar_dl.close()
-    executor.shutdown()
+        pbar_pages.close()
+        pbar_scrape.close()
+        pbar_dl.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
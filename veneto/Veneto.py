@@ -1,9 +1,19 @@
 import os
 import re
 import time
-import pandas as pd
+import queue
+import shutil
+import threading
+import uuid
+import requests
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 from bs4 import BeautifulSoup
 from datetime import datetime
+from urllib.parse import urljoin, urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Selenium Imports
 from selenium import webdriver
@@ -11,6 +21,7 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 
 # --- CONFIGURATION ---
@@ -18,62 +29,92 @@ BASE_URL = "https://www.consiglioveneto.it/leggi-regionali"
 REGION_NAME = "Veneto"
 OUTPUT_DIR = os.path.abspath("Veneto_Laws_Final")
 EXCEL_FILE = "Veneto_Laws_Data.xlsx"
+YEAR_WORKERS = 3  # Chrome instances scraping different years at once
+LAW_LINK_XPATH = "//a[contains(@href, 'dettaglio-legge')]"
+PAGE_PARAMS = ("page", "pagina")  # Exact query names that carry the listing page number
+EXCEL_COLUMNS = ["Region", "Law Number", "Date", "Law Title", "Filename"]
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
 # Regex for metadata
 METADATA_PATTERN = r"(?i)Legge\s+regionale\s+(?P<date>.*?)(?:,|\s+)\s+n\.\s+(?P<number>\d+)"
+_METADATA_RE = re.compile(METADATA_PATTERN)
+_ILLEGAL_FN = re.compile(r'[\\/*?:"<>|]')
+_YEAR_ONCLICK_RE = re.compile(r'setFilterAnno\(.*?,(\d{4})\)')
+
+ITALIAN_MONTHS = {
+    'gennaio': '01', 'febbraio': '02', 'marzo': '03', 'aprile': '04',
+    'maggio': '05', 'giugno': '06', 'luglio': '07', 'agosto': '08',
+    'settembre': '09', 'ottobre': '10', 'novembre': '11', 'dicembre': '12'
+}
+_IT_DATE_RE = re.compile(r'^\s*(\d{1,2})°?\s+(' + '|'.join(ITALIAN_MONTHS) + r')\s+(\d{4})\b', re.IGNORECASE)
 
 # Create output directory
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
 scraped_data = []
+STOP = threading.Event()
+
+# Plain HTTP for the server-rendered detail pages (shared by all year threads)
+META_SESSION = requests.Session()
+META_SESSION.headers.update({"User-Agent": USER_AGENT})
+META_SESSION.mount("https://", HTTPAdapter(pool_connections=YEAR_WORKERS, pool_maxsize=8))
 
 def clean_filename(text):
-    return re.sub(r'[\\/*?:"<>|]', "", text).strip()
+    return _ILLEGAL_FN.sub("", text).strip()
 
 def format_italian_date(date_str):
-    italian_months = {
-        'gennaio': '01', 'febbraio': '02', 'marzo': '03', 'aprile': '04',
-        'maggio': '05', 'giugno': '06', 'luglio': '07', 'agosto': '08',
-        'settembre': '09', 'ottobre': '10', 'novembre': '11', 'dicembre': '12'
-    }
-    try:
-        clean_str = re.sub(r'\s+', ' ', date_str.strip().lower())
-        parts = clean_str.split(' ')
-        if len(parts) >= 3:
-            day = parts[0].zfill(2)
-            month_name = parts[1]
-            year = parts[2]
-            if month_name in italian_months:
-                return f"{year}-{italian_months[month_name]}-{day}"
-    except Exception:
-        pass
+    m = _IT_DATE_RE.match(date_str)
+    if m:
+        day, month_name, year = m.groups()
+        return f"{year}-{ITALIAN_MONTHS[month_name.lower()]}-{day.zfill(2)}"
     return clean_filename(date_str).replace(" ", "-")
 
-def save_excel():
+def new_workbook():
+    """Write-only workbook: records stream out as they are appended (no full-sheet rewrites)."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Veneto")
+    header = []
+    for name in EXCEL_COLUMNS:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+    return wb, ws
+
+def save_excel(wb):
+    # A write-only workbook can be saved exactly once
     if scraped_data:
-        df = pd.DataFrame(scraped_data)
-        cols = ["Region", "Law Number", "Date", "Law Title", "Filename"]
-        final_cols = [c for c in cols if c in df.columns]
-        df[final_cols].to_excel(EXCEL_FILE, index=False)
+        wb.save(EXCEL_FILE)
+
+def page_key(url):
+    """(year, page) signature of a listing URL, so nonce-style params don't defeat loop detection."""
+    parts = urlparse(url)
+    q = parse_qs(parts.query)
+    page = next((q[name][0] for name in PAGE_PARAMS if name in q), None)
+    if page is None:
+        # Unknown paging scheme: fall back to the full (order-independent) query
+        return (parts.path, tuple(sorted((k, tuple(v)) for k, v in q.items())))
+    return (q.get('annoSelezionato', [''])[0], page)
 
-def wait_and_rename(target_filename, timeout=30):
+def wait_and_rename(download_dir, target_filename, initial_files, timeout=30):
+    """Moves the next finished download out of a driver's own download_dir into OUTPUT_DIR.
+
+    initial_files is the listing taken before the click, so a fast download is not mistaken for an old file.
+    """
     end_time = time.time() + timeout
-    initial_files = set(os.listdir(OUTPUT_DIR))
+    # scandir: one directory read per poll, entry types come from the dirent (no extra stat)
     
     while time.time() < end_time:
-        current_files = set(os.listdir(OUTPUT_DIR))
-        new_files = current_files - initial_files
-        
-        for f in new_files:
-            if f.endswith(".crdownload") or f.endswith(".tmp"):
+        for entry in os.scandir(download_dir):
+            if entry.name in initial_files or not entry.is_file():
+                continue
+            if entry.name.endswith((".crdownload", ".tmp")):
                 continue
             try:
-                full_path = os.path.join(OUTPUT_DIR, f)
+                full_path = entry.path
                 final_path = os.path.join(OUTPUT_DIR, target_filename)
                 
-                time.sleep(1) 
-                
                 if os.path.exists(final_path):
                     try:
                         os.remove(final_path)
@@ -83,12 +124,86 @@ def wait_and_rename(target_filename, timeout=30):
                 os.rename(full_path, final_path)
                 return True
             except OSError:
-                time.sleep(1)
                 continue
-        time.sleep(1)
+        time.sleep(0.2)
     return False
 
-def setup_driver():
+def fetch_detail(law_url):
+    """Detail page over requests; None when it fails or the markup needs JS."""
+    try:
+        response = META_SESSION.get(law_url, timeout=15)
+        response.raise_for_status()
+    except Exception:
+        return None
+    soup = BeautifulSoup(response.content, 'lxml')
+    return soup if soup.find('h2', class_='title') else None
+
+def find_pdf_href(soup, page_url):
+    """Absolute href of the 'Pdf testo' link, or None if it is script-driven."""
+    for a in soup.find_all('a', href=True):
+        if 'Pdf testo' in a.get_text():
+            href = a['href'].strip()
+            if href and not href.startswith(('javascript', '#')):
+                return urljoin(page_url, href)
+    return None
+
+def download_pdf(url, file_path):
+    """Streams a PDF straight to disk; False (nothing written) if the reply is not a PDF."""
+    part_path = file_path + ".part"
+    try:
+        with META_SESSION.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=65536)
+            first = next(chunks, b"")
+            if not first.startswith(b"%PDF"):
+                return False
+            with open(part_path, 'wb') as f:
+                f.write(first)
+                for chunk in chunks:
+                    f.write(chunk)
+        os.replace(part_path, file_path)
+        return True
+    except Exception:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        return False
+
+def set_download_dir(driver, path):
+    """Points Chrome's downloads at path via CDP; False if the command is unavailable."""
+    try:
+        driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "allow", "downloadPath": path})
+        return True
+    except Exception:
+        return False
+
+def wait_for_download(driver, slot_dir, target_filename, timeout=30):
+    """Waits for the one file Chrome writes into its private slot_dir, then moves it to OUTPUT_DIR."""
+    def finished_file(_):
+        names = [e.name for e in os.scandir(slot_dir)]  # Holds only this download, never the whole archive
+        finished = [f for f in names if not f.endswith((".crdownload", ".tmp"))]
+        return finished[0] if finished and len(finished) == len(names) else False
+
+    try:
+        name = WebDriverWait(driver, timeout, poll_frequency=0.2).until(finished_file)
+        os.replace(os.path.join(slot_dir, name), os.path.join(OUTPUT_DIR, target_filename))
+        return True
+    except (TimeoutException, OSError):
+        return False
+
+def wait_for_list(driver, old_link=None):
+    """Waits for an AJAX/page reload of the law list instead of sleeping a fixed time."""
+    wait = WebDriverWait(driver, 10)
+    try:
+        if old_link is not None:
+            wait.until(EC.staleness_of(old_link))
+        wait.until(EC.presence_of_element_located((By.XPATH, LAW_LINK_XPATH)))
+    except TimeoutException:
+        pass  # Empty page or no reload: the link scan below decides
+
+_DRIVER_PATH = None  # Resolved chromedriver binary, cached per process
+_DRIVER_LOCK = threading.Lock()
+
+def setup_driver(download_dir=OUTPUT_DIR):
     options = webdriver.ChromeOptions()
     # Use "new" headless for better download support
     options.add_argument("--headless=new") 
@@ -98,11 +213,10 @@ def setup_driver():
     options.add_argument("--disable-dev-shm-usage")
     options.add_argument("--log-level=3")
     
-    user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    options.add_argument(f'user-agent={user_agent}')
+    options.add_argument(f'user-agent={USER_AGENT}')
     
     prefs = {
-        "download.default_directory": OUTPUT_DIR,
+        "download.default_directory": download_dir,
         "download.prompt_for_download": False,
         "download.directory_upgrade": True,
         "plugins.always_open_pdf_externally": True,
@@ -111,168 +225,279 @@ def setup_driver():
     }
     options.add_experimental_option("prefs", prefs)
     
-    return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    # Resolve the chromedriver binary once per process (every year worker starts its own driver)
+    global _DRIVER_PATH
+    with _DRIVER_LOCK:
+        if _DRIVER_PATH is None:
+            _DRIVER_PATH = ChromeDriverManager().install()
+    return webdriver.Chrome(service=Service(_DRIVER_PATH), options=options)
 
-def main():
-    print("--- Starting Veneto Scraper (Year Fix & Smart Skip) ---")
+def wait_for_year_buttons(wait):
+    try:
+        wait.until(EC.presence_of_element_located((By.CLASS_NAME, "filters")))
+        wait.until(EC.presence_of_all_elements_located((By.XPATH, "//button[contains(@onclick, 'setFilterAnno')]")))
+    except Exception:
+        print("  [Warning] Timeout waiting for year buttons.")
+
+def detect_years():
     driver = setup_driver()
-    
-    total_downloaded = 0
-    total_skipped = 0
+    try:
+        driver.get(BASE_URL)
+        wait_for_year_buttons(WebDriverWait(driver, 15))
 
+        # 👇 One round-trip for every onclick instead of get_attribute per button
+        onclicks = driver.execute_script(
+            "return [...document.querySelectorAll('button[onclick*=\"setFilterAnno\"]')]"
+            ".map(b => b.getAttribute('onclick'))")
+        years = []
+        for txt in onclicks:
+            match = _YEAR_ONCLICK_RE.search(txt or "")
+            if match:
+                years.append(match.group(1))
+        return sorted(list(set(years)), reverse=True)
+    finally:
+        driver.quit()
+
+def process_year(year, results):
+    """Scrapes one year in its own browser; records go to the writer queue. Returns counters."""
+    # 👇 Each driver downloads into its own folder so directory diffs never see another year's files
+    download_dir = os.path.join(OUTPUT_DIR, year)
+    os.makedirs(download_dir, exist_ok=True)
+    counts = {"downloaded": 0, "skipped": 0}
+
+    driver = setup_driver(download_dir)
     try:
         driver.get(BASE_URL)
         wait = WebDriverWait(driver, 15)
+        wait_for_year_buttons(wait)
+        print(f"\n==== Processing Year: {year} ====")
         
-        print("Detecting available years...")
+        # 👇 CORE FIX: Click the button explicitly instead of relying on URL
         try:
-            wait.until(EC.presence_of_element_located((By.CLASS_NAME, "filters")))
-            wait.until(EC.presence_of_all_elements_located((By.XPATH, "//button[contains(@onclick, 'setFilterAnno')]")))
-        except Exception:
-            print("  [Warning] Timeout waiting for year buttons.")
+            # Find button specifically for this year
+            xpath = f"//button[contains(@onclick, 'setFilterAnno') and contains(@onclick, '{year}')]"
+            year_btn = driver.find_element(By.XPATH, xpath)
+            old_first = driver.find_elements(By.XPATH, LAW_LINK_XPATH)[:1]
+            driver.execute_script("arguments[0].click();", year_btn)
+            print(f"  [{year}] [Action] Clicked button for {year}")
+            wait_for_list(driver, old_first[0] if old_first else None) # Wait for AJAX reload
+        except Exception as e:
+            print(f"  [{year}] [Warning] Could not click button for {year}. Trying URL fallback.")
+            driver.get(f"{BASE_URL}?annoSelezionato={year}")
+            wait_for_list(driver)
 
-        buttons = driver.find_elements(By.XPATH, "//button[contains(@onclick, 'setFilterAnno')]")
-        years = []
-        for btn in buttons:
-            try:
-                txt = btn.get_attribute("onclick")
-                match = re.search(r'setFilterAnno\(.*?,(\d{4})\)', txt)
-                if match:
-                    years.append(match.group(1))
-            except:
-                continue
-        
-        years = sorted(list(set(years)), reverse=True)
-        print(f"Years found: {years}")
+        # Prevent Infinite Loops
+        visited_keys = set()
 
-        if not years:
-            print("  [Error] No years found.")
-            return
+        while not STOP.is_set():
+            current_url = driver.current_url
+            current_key = page_key(current_url)
+            if current_key in visited_keys:
+                print(f"  [{year}] ⚠️ Loop detected (Page visited twice). Next year.")
+                break
+            visited_keys.add(current_key)
 
-        for year in years:
-            print(f"\n==== Processing Year: {year} ====")
+            # Find laws on page
+            page_urls = driver.execute_script(
+                "return Array.from(new Set("
+                "[...document.querySelectorAll('a[href*=\"dettaglio-legge\"]')].map(a => a.href)))")
             
-            # 👇 CORE FIX: Click the button explicitly instead of relying on URL
-            try:
-                # Find button specifically for this year
-                xpath = f"//button[contains(@onclick, 'setFilterAnno') and contains(@onclick, '{year}')]"
-                year_btn = driver.find_element(By.XPATH, xpath)
-                driver.execute_script("arguments[0].click();", year_btn)
-                print(f"  [Action] Clicked button for {year}")
-                time.sleep(3) # Wait for AJAX reload
-            except Exception as e:
-                print(f"  [Warning] Could not click button for {year}. Trying URL fallback.")
-                driver.get(f"{BASE_URL}?annoSelezionato={year}")
-                time.sleep(3)
+            print(f"  [{year}] Found {len(page_urls)} laws on this page.")
 
-            # Prevent Infinite Loops
-            visited_urls = set()
+            if len(page_urls) == 0:
+                print(f"  [{year}] [Info] No laws found on this page.")
+                break
 
-            while True:
-                current_url = driver.current_url
-                if current_url in visited_urls:
-                    print(f"  ⚠️ Loop detected (Page visited twice). Next year.")
+            left_list = False
+            for law_url in page_urls:
+                if STOP.is_set():
                     break
-                visited_urls.add(current_url)
+                try:
+                    # 👇 Detail pages are server-rendered: Selenium only if requests can't read them
+                    soup = fetch_detail(law_url)
+                    on_detail = soup is None
+                    if on_detail:
+                        left_list = True
+                        driver.get(law_url)
+                        wait.until(EC.presence_of_element_located((By.CLASS_NAME, "title")))
+                        soup = BeautifulSoup(driver.page_source, 'lxml')
 
-                # Find laws on page
-                law_links = driver.find_elements(By.XPATH, "//a[contains(@href, 'dettaglio-legge')]")
-                page_urls = list(set([l.get_attribute('href') for l in law_links]))
-                
-                print(f"  Found {len(page_urls)} laws on this page.")
+                    h2 = soup.find('h2', class_='title')
+                    h2_text = h2.get_text(strip=True) if h2 else ""
+                    p_title = soup.find('p', class_='font-18')
+                    law_title = p_title.get_text(strip=True) if p_title else "No Title"
 
-                if len(page_urls) == 0:
-                    print("  [Info] No laws found on this page.")
-                    break
+                    law_date = "Unknown"
+                    law_num = "Unknown"
+                    match = _METADATA_RE.search(h2_text)
+                    if match:
+                        law_date = match.group("date").strip()
+                        law_num = match.group("number").strip()
 
-                for law_url in page_urls:
-                    try:
-                        driver.get(law_url)
-                        wait.until(EC.presence_of_element_located((By.CLASS_NAME, "title")))
-                        
-                        soup = BeautifulSoup(driver.page_source, 'html.parser')
-                        h2 = soup.find('h2', class_='title')
-                        h2_text = h2.get_text(strip=True) if h2 else ""
-                        p_title = soup.find('p', class_='font-18')
-                        law_title = p_title.get_text(strip=True) if p_title else "No Title"
-
-                        law_date = "Unknown"
-                        law_num = "Unknown"
-                        match = re.search(METADATA_PATTERN, h2_text)
-                        if match:
-                            law_date = match.group("date").strip()
-                            law_num = match.group("number").strip()
-
-                        formatted_date = format_italian_date(law_date)
-                        filename = f"{REGION_NAME}_{law_num}_{formatted_date}.pdf"
-                        file_path = os.path.join(OUTPUT_DIR, filename)
-
-                        record = {
-                            "Region": REGION_NAME,
-                            "Law Title": law_title,
-                            "Law Number": law_num,
-                            "Date": law_date,
-                            "Filename": filename
-                        }
-
-                        # 👇 SKIP CHECK (Before any download action)
-                        if os.path.exists(file_path):
-                            print(f"    [SKIP] Already exists: {filename}")
-                            total_skipped += 1
-                        else:
-                            # Download
-                            try:
-                                download_btn = driver.find_element(By.XPATH, "//a[contains(., 'Pdf testo')]")
-                                driver.execute_script("arguments[0].click();", download_btn)
-                                
-                                if wait_and_rename(filename):
-                                    total_downloaded += 1
-                                    print(f"    [OK] Downloaded: {filename}")
-                                else:
-                                    print(f"    [ERR] Download Timeout")
-                                    record['Filename'] = "Failed Download"
-                            except Exception:
-                                print(f"    [SKIP] No PDF Button found")
-                                record['Filename'] = "No PDF"
-
-                        scraped_data.append(record)
-                        if len(scraped_data) % 10 == 0:
-                            save_excel()
-
-                    except Exception as e:
-                        print(f"    [ERR] Error processing law: {e}")
-
-                # Pagination Logic: Go back to list
+                    formatted_date = format_italian_date(law_date)
+                    filename = f"{REGION_NAME}_{law_num}_{formatted_date}.pdf"
+                    file_path = os.path.join(OUTPUT_DIR, filename)
+
+                    record = {
+                        "Region": REGION_NAME,
+                        "Law Title": law_title,
+                        "Law Number": law_num,
+                        "Date": law_date,
+                        "Filename": filename
+                    }
+
+                    # 👇 SKIP CHECK (Before any download action)
+                    pdf_href = find_pdf_href(soup, law_url)
+                    if os.path.exists(file_path):
+                        print(f"    [SKIP] Already exists: {filename}")
+                        counts["skipped"] += 1
+                    elif pdf_href and download_pdf(pdf_href, file_path):
+                        counts["downloaded"] += 1
+                        print(f"    [OK] Downloaded: {filename}")
+                    else:
+                        # Download through the browser (script-driven link)
+                        try:
+                            if not on_detail:
+                                left_list = True
+                                driver.get(law_url)
+                                wait.until(EC.presence_of_element_located((By.CLASS_NAME, "title")))
+                            download_btn = driver.find_element(By.XPATH, "//a[contains(., 'Pdf testo')]")
+
+                            # 👇 One empty folder per download: completion is known without diffing listings
+                            slot_dir = os.path.join(download_dir, uuid.uuid4().hex)
+                            os.makedirs(slot_dir)
+                            use_slot = set_download_dir(driver, slot_dir)
+                            if not use_slot:
+                                os.rmdir(slot_dir)
+                                initial_files = {e.name for e in os.scandir(download_dir)}
+                            driver.execute_script("arguments[0].click();", download_btn)
+
+                            if use_slot:
+                                ok = wait_for_download(driver, slot_dir, filename)
+                                # A timed-out download leaves its .crdownload behind: drop the whole slot
+                                shutil.rmtree(slot_dir, ignore_errors=True)
+                            else:
+                                ok = wait_and_rename(download_dir, filename, initial_files)
+
+                            if ok:
+                                counts["downloaded"] += 1
+                                print(f"    [OK] Downloaded: {filename}")
+                            else:
+                                print(f"    [ERR] Download Timeout")
+                                record['Filename'] = "Failed Download"
+                        except Exception:
+                            print(f"    [SKIP] No PDF Button found")
+                            record['Filename'] = "No PDF"
+
+                    results.put((year, record))
+
+                except Exception as e:
+                    print(f"    [ERR] Error processing law: {e}")
+
+            # Pagination Logic: Go back to list (only if a law page replaced it)
+            if left_list:
                 driver.get(current_url)
-                time.sleep(2)
-                
-                try:
-                    # Look for "Successiva" (Next)
-                    next_btns = driver.find_elements(By.XPATH, "//a[contains(text(), 'Successiva')]")
-                    if next_btns:
-                        next_url = next_btns[0].get_attribute("href")
-                        
-                        if next_url in visited_urls or next_url == current_url:
-                            print("  [End] Next page is same. Stopping year.")
-                            break
-                            
-                        if "javascript" not in next_url:
-                            print("  Moving to next page...")
-                            driver.get(next_url)
-                            time.sleep(2)
-                            continue
-                    
-                    print("  [End] No 'Successiva' button found.")
-                    break
-                except:
-                    break
+                wait_for_list(driver)
             
+            try:
+                # Look for "Successiva" (Next)
+                next_btns = driver.find_elements(By.XPATH, "//a[contains(text(), 'Successiva')]")
+                if next_btns:
+                    next_url = next_btns[0].get_attribute("href")
+                    
+                    if page_key(next_url) in visited_keys:
+                        print(f"  [{year}] [End] Next page is same. Stopping year.")
+                        break
+                        
+                    if "javascript" not in next_url:
+                        print(f"  [{year}] Moving to next page...")
+                        driver.get(next_url)
+                        wait_for_list(driver)
+                        continue
+                
+                print(f"  [{year}] [End] No 'Successiva' button found.")
+                break
+            except:
+                break
+    finally:
+        driver.quit()
+        try:
+            os.rmdir(download_dir)  # Only succeeds once every download has been moved out
+        except OSError:
+            pass
+    return counts
+
+def excel_writer(results, ws, years):
+    """Single owner of scraped_data and the sheet: writes years in `years` order (newest first)
+    as each one finishes, buffering years that finish early; stops on the None sentinel."""
+    buffers = {year: [] for year in years}
+    finished = set()
+    next_index = 0
+
+    def write_year(year):
+        for record in buffers.pop(year):
+            scraped_data.append(record)
+            ws.append([record[c] for c in EXCEL_COLUMNS])
+
+    while True:
+        item = results.get()
+        if item is None:
+            break
+        year, record = item
+        if record is None:
+            finished.add(year)
+        else:
+            buffers[year].append(record)
+        while next_index < len(years) and years[next_index] in finished:
+            write_year(years[next_index])
+            next_index += 1
+
+    # Interrupted run: whatever was collected, still grouped by year
+    for year in years[next_index:]:
+        write_year(year)
+
+def main():
+    print("--- Starting Veneto Scraper (Year Fix & Smart Skip) ---")
+    total_downloaded = 0
+    total_skipped = 0
+
+    print("Detecting available years...")
+    years = detect_years()
+    print(f"Years found: {years}")
+
+    if not years:
+        print("  [Error] No years found.")
+        return
+
+    wb, ws = new_workbook()
+    results = queue.Queue()
+    writer = threading.Thread(target=excel_writer, args=(results, ws, years), daemon=True)
+    writer.start()
+    executor = ThreadPoolExecutor(max_workers=YEAR_WORKERS)
+    futures = {}
+
+    try:
+        futures = {executor.submit(process_year, year, results): year for year in years}
+        for future in as_completed(futures):
+            try:
+                counts = future.result()
+                total_downloaded += counts["downloaded"]
+                total_skipped += counts["skipped"]
+            except Exception as e:
+                print(f"  [ERR] Year {futures[future]} failed: {e}")
+            results.put((futures[future], None))  # Year finished: the writer may flush it
     except KeyboardInterrupt:
         print("\nStopping...")
+        STOP.set()
     finally:
-        driver.quit()
-        save_excel()
+        # Manual cancel instead of shutdown(cancel_futures=True), which needs Python 3.9
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        results.put(None)
+        writer.join()
+        save_excel(wb)
         print(f"\nDone. Downloaded: {total_downloaded}, Skipped: {total_skipped}.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()